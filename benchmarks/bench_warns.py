@@ -0,0 +1,80 @@
+"""
+Benchmark: increment_warn RPC vs read-modify-write warns under concurrency
+
+Runs against the Supabase project configured in .env, using a throwaway
+user ID, and counts HTTP round trips with an httpx request hook.
+
+    python benchmarks/bench_warns.py [--warns 50] [--concurrency 10]
+
+Requires sql/increment_warn.sql to be installed for the RPC numbers.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database import db  # noqa: E402
+
+BENCH_USER_ID = int(os.getenv("BENCH_USER_ID", "999000001"))
+
+
+class RoundTripCounter:
+    """httpx event hook counting every request sent to PostgREST"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, request):
+        self.count += 1
+
+
+def run(label, warn_fn, warns, concurrency, counter):
+    db.client.table("users").delete().eq("user_id", BENCH_USER_ID).execute()
+    counter.count = 0
+
+    def timed_warn(_):
+        start = time.perf_counter()
+        warn_fn(BENCH_USER_ID)
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed_warn, range(warns)))
+    elapsed = time.perf_counter() - started
+    round_trips = counter.count
+
+    final = db.get_user_stats(BENCH_USER_ID)
+    final_count = final["warn_count"] if final else 0
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{label:<22} round trips/warn: {round_trips / warns:5.2f}  "
+        f"p50: {statistics.median(latencies) * 1000:7.1f}ms  p95: {p95 * 1000:7.1f}ms  "
+        f"total: {elapsed:6.2f}s  lost increments: {warns - final_count}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--warns", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    counter = RoundTripCounter()
+    db.client.postgrest.session.event_hooks["request"].append(counter)
+
+    print(f"{args.warns} warns on one user, {args.concurrency} concurrent callers\n")
+    try:
+        run("read-modify-write", db._add_warn_fallback, args.warns, args.concurrency, counter)
+        run("increment_warn RPC", db._add_warn_rpc, args.warns, args.concurrency, counter)
+    finally:
+        db.client.table("users").delete().eq("user_id", BENCH_USER_ID).execute()
+
+
+if __name__ == "__main__":
+    main()
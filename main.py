@@ -6,7 +6,6 @@ Starts the Telegram bot
 import logging
 import os
 from dotenv import load_dotenv
-from keep_alive import keep_alive
 
 # Load environment variables
 load_dotenv(override=False)
@@ -23,12 +22,9 @@ logger.info("🚀 Starting bot from main.py...")
 try:
     from src.bot import main
     logger.info("✅ Successfully imported main from src.bot")
-    
-    # 🟢 NEW: Start the fake web server to keep the bot alive on Render
-    keep_alive()
-    logger.info("✅ Keep-alive server started")
 
-    # Start the bot (This blocks the script, so keep_alive must be above it)
+    # Start the bot (blocking). Health checks are served on $PORT by
+    # src/web_server.py on the bot's own event loop, in both polling and webhook mode
     main()  
 except ImportError as e:
     logger.error(f"❌ Import error: {e}", exc_info=True)
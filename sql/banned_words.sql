@@ -0,0 +1,5 @@
+-- Unique constraint used by the idempotent bulk seeding in
+-- DatabaseManager.initialize_default_banned_words (upsert on_conflict="word").
+-- Run once in the Supabase SQL editor.
+
+create unique index if not exists banned_words_word_key on banned_words (word);
@@ -0,0 +1,25 @@
+-- Versioned banned_words rows for cross-instance cache coherence.
+-- Every insert/update stamps updated_at; removals become is_deleted tombstones,
+-- so each bot instance can fetch only the rows changed since its watermark
+-- (DatabaseManager.sync_banned_words).
+-- Run once in the Supabase SQL editor.
+
+alter table banned_words add column if not exists updated_at timestamptz not null default now();
+alter table banned_words add column if not exists is_deleted boolean not null default false;
+
+create index if not exists banned_words_updated_at_idx on banned_words (updated_at);
+
+create or replace function banned_words_touch()
+returns trigger
+language plpgsql
+as $$
+begin
+  new.updated_at := now();
+  return new;
+end;
+$$;
+
+drop trigger if exists banned_words_touch on banned_words;
+create trigger banned_words_touch
+  before insert or update on banned_words
+  for each row execute function banned_words_touch();
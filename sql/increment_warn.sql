@@ -0,0 +1,14 @@
+-- Atomic warn increment used by DatabaseManager.add_warn
+-- Creates the user row if needed and returns the new warn count in one round trip.
+-- Run once in the Supabase SQL editor.
+
+create or replace function increment_warn(p_user_id bigint, p_username text default 'unknown')
+returns integer
+language sql
+as $$
+  insert into users (user_id, username, warn_count)
+  values (p_user_id, p_username, 1)
+  on conflict (user_id) do update
+    set warn_count = users.warn_count + 1
+  returning warn_count;
+$$;
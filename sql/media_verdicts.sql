@@ -0,0 +1,19 @@
+-- Persistent media verdicts keyed by Telegram's file_unique_id
+-- (DatabaseManager.get_media_verdict / save_media_verdict).
+-- phash is the signed 64-bit pHash of the image (or of the thumbnail for
+-- videos, GIFs and animated stickers), used to block near-duplicates of
+-- blocked images (DatabaseManager.get_blocked_phashes).
+-- Run once in the Supabase SQL editor.
+
+create table if not exists media_verdicts (
+  file_unique_id text primary key,
+  action text not null check (action in ('ALLOW', 'BLOCK')),
+  reason text,
+  phash bigint,
+  created_at timestamptz not null default now()
+);
+
+alter table media_verdicts add column if not exists phash bigint;
+
+create index if not exists media_verdicts_blocked_phash_idx
+  on media_verdicts (action) where phash is not null;
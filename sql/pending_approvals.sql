@@ -0,0 +1,16 @@
+-- Media waiting for manual approval, keyed by the message ID of the copy
+-- forwarded to the owner (src/approval_queue.py). created_at is unix time
+-- so expiry works the same on every backend.
+-- Run once in the Supabase SQL editor.
+
+create table if not exists pending_approvals (
+  message_id bigint primary key,
+  chat_id bigint not null,
+  user_id bigint not null,
+  file_unique_id text,
+  sticker_set text,
+  phash bigint,
+  created_at bigint not null
+);
+
+create index if not exists pending_approvals_created_at_idx on pending_approvals (created_at);
@@ -0,0 +1,13 @@
+-- Pending deletions of flash messages (warnings, command replies), so they
+-- still get deleted after a restart (src/deletion_scheduler.py).
+-- due_at is unix time.
+-- Run once in the Supabase SQL editor.
+
+create table if not exists scheduled_deletions (
+  chat_id bigint not null,
+  message_id bigint not null,
+  due_at double precision not null,
+  primary key (chat_id, message_id)
+);
+
+create index if not exists scheduled_deletions_due_at_idx on scheduled_deletions (due_at);
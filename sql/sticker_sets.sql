@@ -0,0 +1,52 @@
+-- Per sticker pack verdicts (DatabaseManager.get_sticker_set / record_sticker_verdict /
+-- set_sticker_set_action).
+-- action is set by /allowpack and /blockpack (source 'admin') or promoted
+-- automatically once enough stickers of the pack got the same verdict
+-- (source 'auto'); null means "scan stickers individually".
+-- Run once in the Supabase SQL editor.
+
+create table if not exists sticker_sets (
+  set_name text primary key,
+  action text check (action in ('ALLOW', 'BLOCK')),
+  source text check (source in ('admin', 'auto')),
+  allow_count integer not null default 0,
+  block_count integer not null default 0,
+  updated_at timestamptz not null default now()
+);
+
+create or replace function sticker_sets_touch()
+returns trigger
+language plpgsql
+as $$
+begin
+  new.updated_at := now();
+  return new;
+end;
+$$;
+
+drop trigger if exists sticker_sets_touch on sticker_sets;
+create trigger sticker_sets_touch
+  before insert or update on sticker_sets
+  for each row execute function sticker_sets_touch();
+
+-- Count one sticker's verdict and promote the pack in one round trip, so
+-- concurrent updates never overwrite each other's tallies or an admin's action.
+create or replace function record_sticker_verdict(p_set_name text, p_action text, p_threshold integer)
+returns setof sticker_sets
+language sql
+as $$
+  insert into sticker_sets (set_name, allow_count, block_count)
+  values (p_set_name, (p_action = 'ALLOW')::int, (p_action = 'BLOCK')::int)
+  on conflict (set_name) do update
+    set allow_count = sticker_sets.allow_count + excluded.allow_count,
+        block_count = sticker_sets.block_count + excluded.block_count;
+
+  update sticker_sets
+    set action = p_action, source = 'auto'
+    where set_name = p_set_name
+      and action is null
+      and case when p_action = 'ALLOW' then allow_count >= p_threshold and block_count = 0
+               else block_count >= p_threshold and allow_count = 0 end;
+
+  select * from sticker_sets where set_name = p_set_name;
+$$;
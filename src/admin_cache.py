@@ -0,0 +1,122 @@
+"""
+Per-chat admin roster cache
+Filled from get_chat_administrators and kept current by ChatMember updates
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Optional, Set, Tuple
+from telegram import Update, ChatMember, ChatMemberUpdated
+from telegram.ext import ContextTypes
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATUSES = {ChatMember.ADMINISTRATOR, ChatMember.OWNER}
+# Fallback for older versions that might still use CREATOR
+if hasattr(ChatMember, 'CREATOR'):
+    ADMIN_STATUSES.add(ChatMember.CREATOR)
+
+
+class AdminRoster:
+    """
+    Admin user IDs per chat.
+
+    A chat's roster is fetched once with get_chat_administrators and then
+    patched in place from ChatMemberUpdated events; a TTL refresh covers
+    any update the bot missed (e.g. while it was offline).
+    """
+
+    def __init__(self, ttl: float = 600.0):
+        self.ttl = ttl
+        self._rosters: Dict[int, Tuple[Set[int], float]] = {}
+        # One in-flight fetch per chat, however many messages arrive meanwhile
+        self._fetch_locks: Dict[int, asyncio.Lock] = {}
+        self.hits = 0
+        self.refreshes = 0
+        self.member_updates = 0
+
+    async def get_admins(self, bot, chat_id: int) -> Set[int]:
+        roster = self._fresh_roster(chat_id)
+        if roster is not None:
+            self.hits += 1
+            return roster
+
+        lock = self._fetch_locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            # Another caller may have refreshed while we waited
+            roster = self._fresh_roster(chat_id)
+            if roster is not None:
+                self.hits += 1
+                return roster
+
+            administrators = await bot.get_chat_administrators(chat_id)
+            roster = {member.user.id for member in administrators}
+            self._rosters[chat_id] = (roster, time.monotonic())
+            self.refreshes += 1
+            return roster
+
+    def _fresh_roster(self, chat_id: int) -> Optional[Set[int]]:
+        entry = self._rosters.get(chat_id)
+        if entry is None:
+            return None
+        roster, fetched_at = entry
+        if time.monotonic() - fetched_at > self.ttl:
+            return None
+        return roster
+
+    def apply_member_update(self, change: Optional[ChatMemberUpdated]):
+        """Promote/demote a user in a cached roster from a ChatMemberUpdated event"""
+        if change is None:
+            return
+        entry = self._rosters.get(change.chat.id)
+        if entry is None:
+            # Not cached yet; the first admin check will fetch the full roster
+            return
+
+        roster, _ = entry
+        user_id = change.new_chat_member.user.id
+        if change.new_chat_member.status in ADMIN_STATUSES:
+            roster.add(user_id)
+        else:
+            roster.discard(user_id)
+        self.member_updates += 1
+
+    def invalidate(self, chat_id: int):
+        self._rosters.pop(chat_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "chats": len(self._rosters),
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "member_updates": self.member_updates,
+        }
+
+
+ADMIN_ROSTER = AdminRoster(ttl=float(os.getenv("ADMIN_CACHE_TTL", "600")))
+metrics.register("admin_roster", ADMIN_ROSTER.stats)
+
+
+async def is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """Check if the user is a group administrator (in-memory roster lookup)"""
+    if not update.message or not update.effective_user:
+        return False
+
+    # Private chats have no administrators
+    if update.message.chat.type == 'private':
+        return False
+
+    try:
+        admins = await ADMIN_ROSTER.get_admins(context.bot, update.message.chat_id)
+        return update.effective_user.id in admins
+    except Exception as e:
+        logger.error(f"خطا در بررسی دسترسی ادمین: {e}")
+        return False
+
+
+async def track_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """ChatMemberHandler callback: keep cached rosters in sync with promotions/demotions"""
+    ADMIN_ROSTER.apply_member_update(update.chat_member or update.my_chat_member)
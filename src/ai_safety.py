@@ -17,18 +17,8 @@ if api_key:
 else:
     logger.warning("⚠️ GEMINI_API_KEY is missing. AI moderation will be skipped.")
 
-def scan_media(content_bytes, mime_type, banned_words_list):
-    """
-    Scans media using Gemini Flash. Returns decision JSON or None on error.
-    """
-    if not api_key:
-        return None
-
-    # Convert list of words to comma-separated string
-    banned_txt = ", ".join(banned_words_list)
-
-    # 🟢 SUPER PROMPT: STRICT RULES FOR LINKS, WORDS, AND PORN
-    prompt = f"""
+# 🟢 SUPER PROMPT: STRICT RULES FOR LINKS, WORDS, AND PORN
+PROMPT_TEMPLATE = """
     You are a strict Telegram Super Admin Bot.
     Analyze this content (Image, Video, Audio, Sticker, GIF).
     
@@ -53,27 +43,85 @@ def scan_media(content_bytes, mime_type, banned_words_list):
     }}
     """
 
-    # Disable safety filters so the AI can actually SEE the bad content to judge it
-    safety_settings = {
-        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+# 🟢 NEW: Fixed prompt for "extract" mode. The model only reads the media;
+# banned words and links are matched locally, so the prompt never changes
+# and its size doesn't depend on the banned word list.
+EXTRACT_PROMPT = """
+    You are a content reader for a Telegram moderation bot.
+    Analyze this content (Image, Video, Audio, Sticker, GIF).
+    
+    1. Transcribe ALL visible or spoken text exactly as written (any language,
+       keep spacing and punctuation, including text in QR codes if readable).
+    2. NSFW: Nudity, sexual acts, excessive gore, or violence?
+    3. LINK: Any website URL, QR Code, or Telegram link (t.me, @username),
+       even if hidden ("w w w . g o o g l e . c o m", "google dot com", "t (dot) me")?
+    
+    OUTPUT FORMAT (JSON ONLY):
+    {
+        "text": "All text found, or empty string",
+        "nsfw": true or false,
+        "link": true or false,
+        "reason": "Short explanation if nsfw or link is true"
     }
+    """
+
+# "inline" (banned words in the prompt) or, opt-in, "extract" (fixed prompt, local matching)
+PROMPT_MODES = ("inline", "extract")
+PROMPT_MODE = os.getenv("AI_PROMPT_MODE", "inline").strip().lower()
+if PROMPT_MODE not in PROMPT_MODES:
+    logger.warning(f"⚠️ Unknown AI_PROMPT_MODE '{PROMPT_MODE}' (expected one of {PROMPT_MODES}), using 'inline'")
+    PROMPT_MODE = "inline"
+
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-flash-latest")
+
+# Disable safety filters so the AI can actually SEE the bad content to judge it
+SAFETY_SETTINGS = {
+    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+}
+
+_model = None
+
+
+def get_model():
+    """The shared GenerativeModel (created on first use, then reused)"""
+    global _model
+    if _model is None:
+        _model = genai.GenerativeModel(MODEL_NAME, safety_settings=SAFETY_SETTINGS)
+    return _model
+
+
+def build_prompt(banned_words_list) -> str:
+    return PROMPT_TEMPLATE.format(banned_txt=", ".join(banned_words_list))
+
+
+def scan_media(content_bytes, mime_type, banned_words_list=None, prompt=None):
+    """
+    Scans media using Gemini Flash. Returns decision JSON or None on error.
+    
+    Pass a pre-rendered `prompt` to skip formatting the banned word list.
+    `content_bytes` may also be a file object (e.g. a spooled download); it
+    is read here, on the worker thread, only while the request runs.
+    """
+    if not api_key:
+        return None
+
+    if prompt is None:
+        prompt = build_prompt(banned_words_list or [])
 
     try:
-       # Try specific stable version
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
-        
+        if hasattr(content_bytes, "read"):
+            content_bytes.seek(0)
+            content_bytes = content_bytes.read()
+
         content_blob = {
             'mime_type': mime_type,
             'data': content_bytes
         }
 
-        response = model.generate_content(
-            [prompt, content_blob],
-            safety_settings=safety_settings
-        )
+        response = get_model().generate_content([prompt, content_blob])
         
         # Clean response (sometimes it wraps in ```json ... ```)
         text = response.text.replace('```json', '').replace('```', '').strip()
@@ -81,4 +129,4 @@ def scan_media(content_bytes, mime_type, banned_words_list):
 
     except Exception as e:
         logger.error(f"Gemini API Error: {e}")
-        return None # Return None to trigger Manual Fallback
\ No newline at end of file
+        return None # Return None to trigger Manual Fallback
@@ -0,0 +1,134 @@
+"""
+Manual approval queue
+Pending media is persisted in the database (survives restarts, shared
+between processes) with a bounded in-memory index for O(1) lookups
+"""
+
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional
+from src.database import async_db
+from src.phash import to_signed64, from_signed64
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ApprovalQueue:
+    """
+    Pending approvals keyed by the message ID of the copy forwarded to the owner.
+
+    The index is kept in insertion (= age) order, so expiry and cap eviction
+    only ever look at the oldest entries. Entries expire after `ttl`
+    seconds; beyond `max_size` the oldest are dropped.
+    """
+
+    def __init__(self, ttl: float = 86400.0, max_size: int = 1000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._index: "OrderedDict[int, dict]" = OrderedDict()
+        self.added = 0
+        self.resolved = 0
+        self.expired = 0
+        self.evicted = 0
+
+    async def load(self) -> int:
+        """Rebuild the index from the database (pending items from before a restart)"""
+        rows = await async_db.get_pending_approvals(int(time.time() - self.ttl))
+        for row in rows[-self.max_size:]:
+            self._index[row["message_id"]] = self._from_row(row)
+        logger.info(f"Loaded {len(self._index)} pending approvals")
+        return len(self._index)
+
+    async def add(self, message_id: int, chat_id: int, user_id: int, file_unique_id: Optional[str] = None,
+                  sticker_set: Optional[str] = None, phash: Optional[int] = None):
+        entry = {
+            "message_id": message_id,
+            "chat_id": chat_id,
+            "user_id": user_id,
+            "file_unique_id": file_unique_id,
+            "sticker_set": sticker_set,
+            "phash": phash,
+            "created_at": int(time.time()),
+        }
+        self._index[message_id] = entry
+        self.added += 1
+        await async_db.save_pending_approval(self._to_row(entry))
+
+        if len(self._index) > self.max_size:
+            evicted = []
+            while len(self._index) > self.max_size:
+                evicted.append(self._index.popitem(last=False)[0])
+            self.evicted += len(evicted)
+            logger.warning(f"Approval queue full, dropped {len(evicted)} oldest pending items")
+            await async_db.delete_pending_approvals(evicted)
+
+    async def get(self, message_id: int) -> Optional[dict]:
+        """Pending entry for a forwarded message (index first, then the database)"""
+        entry = self._index.get(message_id)
+        if entry is None:
+            # Added by another process (or before this one loaded)
+            row = await async_db.get_pending_approval(message_id)
+            entry = self._from_row(row) if row else None
+        if entry is None or self._is_expired(entry):
+            return None
+        return entry
+
+    async def resolve(self, message_id: int):
+        """Remove an approved/rejected entry"""
+        self._index.pop(message_id, None)
+        self.resolved += 1
+        await async_db.delete_pending_approvals([message_id])
+
+    async def sweep(self, context=None) -> int:
+        """Drop expired entries (job callback)"""
+        count = 0
+        while self._index:
+            oldest = next(iter(self._index.values()))
+            if not self._is_expired(oldest):
+                break
+            self._index.popitem(last=False)
+            count += 1
+        await async_db.delete_expired_approvals(int(time.time() - self.ttl))
+        if count:
+            self.expired += count
+            logger.info(f"Expired {count} pending approvals")
+        return count
+
+    def _is_expired(self, entry: dict) -> bool:
+        return time.time() - entry["created_at"] > self.ttl
+
+    @staticmethod
+    def _to_row(entry: dict) -> dict:
+        row = dict(entry)
+        if row["phash"] is not None:
+            row["phash"] = to_signed64(row["phash"])
+        return row
+
+    @staticmethod
+    def _from_row(row: dict) -> dict:
+        entry = dict(row)
+        if entry.get("phash") is not None:
+            entry["phash"] = from_signed64(entry["phash"])
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._index),
+            "added": self.added,
+            "resolved": self.resolved,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+APPROVALS = ApprovalQueue(
+    ttl=float(os.getenv("APPROVAL_TTL", "86400")),
+    max_size=int(os.getenv("APPROVAL_MAX_PENDING", "1000")),
+)
+metrics.register("approval_queue", APPROVALS.stats)
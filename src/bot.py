@@ -8,8 +8,7 @@ import logging
 import asyncio
 from dotenv import load_dotenv
 from telegram import Update, BotCommand, BotCommandScopeAllChatAdministrators
-from telegram.request import HTTPXRequest
-from telegram.ext import Application, ContextTypes, CommandHandler, MessageHandler, filters
+from telegram.ext import Application, ContextTypes, CommandHandler, MessageHandler, ChatMemberHandler, filters
 
 # Load environment variables (from .env if it exists locally)
 # On Railway, environment variables are set directly in the dashboard
@@ -38,6 +37,8 @@ async def setup_commands(app):
         BotCommand("ban", "🚫 بن کردن کاربر"),
         BotCommand("unmute", "🔊 باز کردن سکوت"),
         BotCommand("addword", "📝 اضافه کردن کلمه ممنوع"),
+        BotCommand("allowpack", "✅ مجاز کردن پک استیکر"),
+        BotCommand("blockpack", "⛔ ممنوع کردن پک استیکر"),
     ]
     
     try:
@@ -55,6 +56,22 @@ async def setup_commands(app):
         logger.error(f"Error setting commands: {e}")
 
 
+async def start_services(app):
+    """post_init: background services that need an initialized bot"""
+    from src.deletion_scheduler import DELETIONS
+    from src.web_server import WEB_SERVER, BOT_MODE
+    await DELETIONS.start(app.bot)
+    await WEB_SERVER.start(app, webhook=BOT_MODE == "webhook")
+
+
+async def stop_services(app):
+    """post_shutdown: persist state of background services"""
+    from src.deletion_scheduler import DELETIONS
+    from src.web_server import WEB_SERVER
+    await WEB_SERVER.stop()
+    await DELETIONS.stop()
+
+
 async def setup_application():
     """Setup and return the application (non-blocking setup)"""
     # Get token from environment
@@ -69,22 +86,23 @@ async def setup_application():
         raise ValueError("TELEGRAM_TOKEN must be set in environment variables")
     
     # Create application
-    # 🟢 FIX: Increase timeout to 60 seconds to fix Railway crashing
-    # 🟢 FIX: Optimized timings for faster response
-    # connect_timeout=30: Wait 30s to establish connection (prevents startup crashes)
-    # read_timeout=10: If no data for 10s, refresh the connection (fixes the lag!)
-# 🟢 FIX: Increase Pool Size to handle spam bursts
-    # 🟢 FIX: Increased Pool Size, Removed the invalid parameter
-    
-    request = HTTPXRequest(connect_timeout=60, read_timeout=60)
-    application = Application.builder().token(token).request(request).build()
+    # 🟢 NEW: Pool size, keep-alive, HTTP version and timeouts come from TG_* env vars;
+    # get_updates has its own connection so long polling never blocks API calls
+    from src.http_client import build_requests
+    request, get_updates_request = build_requests()
     
-    application = Application.builder().token(token).request(request).build()
+    application = (
+        Application.builder().token(token)
+        .request(request).get_updates_request(get_updates_request)
+        .post_init(start_services).post_shutdown(stop_services)
+        .build()
+    )
 
     # Import handlers
     from src.handlers.commands import start, help_command, stats
-    from src.handlers.moderation import warn, ban, unmute, addword
+    from src.handlers.moderation import warn, ban, unmute, addword, allowpack, blockpack
     from src.handlers.message_handler import handle_text, check_media, handle_approval
+    from src.admin_cache import track_chat_member
     
     # Add handlers
     application.add_handler(CommandHandler("start", start))
@@ -94,6 +112,8 @@ async def setup_application():
     application.add_handler(CommandHandler("ban", ban))
     application.add_handler(CommandHandler("unmute", unmute))
     application.add_handler(CommandHandler("addword", addword))
+    application.add_handler(CommandHandler("allowpack", allowpack))
+    application.add_handler(CommandHandler("blockpack", blockpack))
     # 🟢 NEW: Approval Handler (Listens for "تایید" in Private Chat)
     # 🟢 FIX: Listen for BOTH "تایید" (Approve) and "رد" (Reject)
     application.add_handler(MessageHandler(filters.Regex(r"^(تایید|رد)$") & filters.ChatType.PRIVATE, handle_approval))
@@ -109,8 +129,29 @@ async def setup_application():
     # Handler 2: Catches only Text and Captions
     application.add_handler(MessageHandler((filters.TEXT | filters.CAPTION) & ~filters.COMMAND, handle_text))
     
+    # 🟢 NEW: Keep the cached admin rosters current (promotions/demotions)
+    application.add_handler(ChatMemberHandler(track_chat_member, ChatMemberHandler.ANY_CHAT_MEMBER))
+    
     logger.info("✅ Handlers setup completed")
     
+    # 🟢 NEW: Periodically log cache/queue metrics for monitoring
+    from src.metrics import log_metrics
+    metrics_interval = int(os.getenv("METRICS_LOG_INTERVAL", "300"))
+    if application.job_queue and metrics_interval > 0:
+        application.job_queue.run_repeating(log_metrics, interval=metrics_interval, first=metrics_interval)
+    
+    # 🟢 NEW: Handlers never load the banned word list themselves (that would block
+    # the event loop); retry here, off the loop, if the load at import failed
+    from src.database import async_db
+    await async_db.ensure_banned_words_loaded()
+    
+    # 🟢 NEW: Restore media still waiting for manual approval, expire stale ones
+    from src.approval_queue import APPROVALS
+    await APPROVALS.load()
+    sweep_interval = int(os.getenv("APPROVAL_SWEEP_INTERVAL", "600"))
+    if application.job_queue and sweep_interval > 0:
+        application.job_queue.run_repeating(APPROVALS.sweep, interval=sweep_interval, first=sweep_interval)
+    
     # Setup commands
     await setup_commands(application)
     
@@ -129,8 +170,14 @@ def main():
         # Setup the application using the event loop
         application = loop.run_until_complete(setup_application())
         
-        # Run polling - this uses the existing event loop
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        # 🟢 NEW: BOT_MODE=webhook receives updates over HTTP instead of long polling
+        from src.web_server import BOT_MODE, run_webhook
+        if BOT_MODE == "webhook":
+            loop.run_until_complete(run_webhook(application))
+        else:
+            # Run polling - this uses the existing event loop
+            # (a webhook left over from webhook mode is removed first)
+            application.run_polling(allowed_updates=Update.ALL_TYPES)
     finally:
         loop.close()
 
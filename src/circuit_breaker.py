@@ -0,0 +1,157 @@
+"""
+Circuit breaker and retry budget for calls to external services
+"""
+
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Trips when too many recent calls fail or are slow.
+
+    closed    -> every call is allowed; outcomes go into a sliding window
+    open      -> calls are refused until `open_seconds` have passed
+    half_open -> up to `half_open_trials` probe calls are allowed; all of
+                 them succeeding closes the breaker, any failure re-opens it
+    """
+
+    def __init__(self, name: str, window: int = 20, min_calls: int = 5, failure_rate: float = 0.5,
+                 slow_call_seconds: float = 20.0, open_seconds: float = 60.0, half_open_trials: int = 2):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_trials = half_open_trials
+
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)  # True = failed or slow
+        self._opened_at = 0.0
+        self._trials_started = 0
+        self._trials_passed = 0
+        self.times_opened = 0
+        self.refused = 0
+
+    def is_open(self) -> bool:
+        """Whether calls are currently being refused (no side effects)"""
+        return self.state == OPEN and time.monotonic() - self._opened_at < self.open_seconds
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now (counts as a probe while half-open)"""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.refused += 1
+                return False
+            self._transition(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            if self._trials_started >= self.half_open_trials:
+                self.refused += 1
+                return False
+            self._trials_started += 1
+        return True
+
+    def cancel(self):
+        """An allowed call never reached the service (e.g. local queue timeout)"""
+        if self.state == HALF_OPEN and self._trials_started > self._trials_passed:
+            self._trials_started -= 1
+
+    def record(self, success: bool, duration: float = 0.0):
+        """Report the outcome of an allowed call"""
+        bad = not success or duration > self.slow_call_seconds
+
+        if self.state == HALF_OPEN:
+            if bad:
+                self._transition(OPEN)
+            else:
+                self._trials_passed += 1
+                if self._trials_passed >= self.half_open_trials:
+                    self._transition(CLOSED)
+            return
+
+        if self.state == OPEN:
+            return  # Late result of a call started before the breaker tripped
+
+        self._outcomes.append(bad)
+        if len(self._outcomes) >= self.min_calls:
+            rate = sum(self._outcomes) / len(self._outcomes)
+            if rate >= self.failure_rate:
+                logger.warning(
+                    f"Circuit {self.name}: {rate:.0%} of the last {len(self._outcomes)} calls failed or were slow"
+                )
+                self._transition(OPEN)
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.warning(f"⚡ Circuit {self.name}: {self.state} -> {state}")
+        self.state = state
+        self._trials_started = 0
+        self._trials_passed = 0
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+        elif state == CLOSED:
+            self._outcomes.clear()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "window_failures": sum(self._outcomes),
+            "window_calls": len(self._outcomes),
+            "times_opened": self.times_opened,
+            "refused": self.refused,
+        }
+
+
+class RetryBudget:
+    """
+    Caps retries at `ratio` of the requests seen in the last `window`
+    seconds (plus `min_retries`), so retries can't multiply load on a
+    service that is already failing.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 3, window: float = 60.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests = deque()
+        self._retries = deque()
+        self.exhausted = 0
+
+    def _trim(self, now: float):
+        cutoff = now - self.window
+        for events in (self._requests, self._retries):
+            while events and events[0] < cutoff:
+                events.popleft()
+
+    def record_request(self):
+        now = time.monotonic()
+        self._trim(now)
+        self._requests.append(now)
+
+    def try_retry(self) -> bool:
+        """Spend one retry if the budget allows it"""
+        now = time.monotonic()
+        self._trim(now)
+        if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+            self.exhausted += 1
+            return False
+        self._retries.append(now)
+        return True
+
+    def stats(self) -> dict:
+        self._trim(time.monotonic())
+        return {
+            "requests": len(self._requests),
+            "retries": len(self._retries),
+            "exhausted": self.exhausted,
+        }
@@ -4,20 +4,138 @@ Handles all database operations for the Telegram bot
 """
 
 import os
+import atexit
+import asyncio
+import functools
 import logging
-from typing import List, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from src.word_matcher import BannedWordMatcher, WordMatch
+from src import metrics
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Returned instead of None where "not found" and "lookup failed" must be told apart
+DB_ERROR = object()
+
+
+def _is_missing_schema(error: Exception) -> bool:
+    """The error says a table, column or function doesn't exist (as opposed to a transient failure)"""
+    message = str(error)
+    return any(code in message for code in ("42P01", "42703", "42883", "PGRST202", "PGRST204", "PGRST205"))
+
+
+# Default Persian spam and profanity words (seeded into an empty banned_words table)
+DEFAULT_BANNED_WORDS = [
+    # Spam/Advertising words
+    "تبلیغ",
+    "صیغه",
+    "لینک",
+    "فروش",
+    "خرید",
+    "کسب درآمد",
+    "کار در خانه",
+    "کریپتو",
+    "بیت کوین",
+    # Profanity and explicit words
+    "کون",
+    "کونی",
+    "کونکش",
+    "کون گشاد",
+    "کص",
+    "کصکش",
+    "کص کش",
+    "کیر",
+    "دودول",
+    "خایه",
+    "گوه",
+    "عن",
+    "کون کش",
+    "کس کش",
+    "کسکش",
+    "بیشرف",
+    "قهبه",
+    "جنده",
+    "ناموس",
+    "بیناموس",
+    "بی ناموس",
+    "گاییدم",
+    "گایید",
+    "کیرم",
+    "کیرت",
+    "گاییدن",
+    "گایش",
+    "مادرتو",
+    "ننتو",
+    "مامانتو",
+    "حرومزاده",
+    "حرامزاده",
+    "حروم زاده",
+    "حرام زاده",
+    "بیخایه",
+    "بی خایه"
+]
+
 
 class DatabaseManager:
     """Database manager for Supabase operations"""
     
     def __init__(self):
         """Initialize Supabase client and cache"""
+        started = time.perf_counter()
+        self._connect()
+        client_ready = time.perf_counter()
+        
+        self.banned_words_cache: List[str] = []
+        self.banned_words_matcher = BannedWordMatcher()
+        # Bumped on every change to the banned word list (verdict caches key on it)
+        self.banned_words_version = 0
+        self._cache_loaded = False
+        self._reload_lock = threading.Lock()
+        self._reload_running = False
+        self._last_reload_attempt = 0.0
+        
+        # Cross-instance coherence: poll banned_words rows changed since the watermark
+        # (from the epoch until a load sees a row, so an empty table still syncs)
+        self._banned_words_watermark = datetime.fromtimestamp(0, timezone.utc)
+        self._banned_words_sync_interval = float(os.getenv("BANNED_WORDS_SYNC_INTERVAL", "30"))
+        
+        # Known-user LRU and write-behind registration queue
+        self._known_users: "OrderedDict[int, None]" = OrderedDict()
+        self._known_users_max = int(os.getenv("KNOWN_USERS_CACHE_SIZE", "100000"))
+        self._pending_users: Dict[int, dict] = {}
+        self._users_lock = threading.Lock()
+        self._user_flush_interval = float(os.getenv("USER_FLUSH_INTERVAL", "5"))
+        self._user_flush_batch = int(os.getenv("USER_FLUSH_BATCH", "500"))
+        self._user_flush_event = threading.Event()
+        threading.Thread(target=self._user_flush_loop, name="user-flush", daemon=True).start()
+        atexit.register(self.flush_pending_users)
+        
+        # Seed (bulk, only on an empty table), then warm the cache exactly once
+        self.initialize_default_banned_words()
+        seeded = time.perf_counter()
+        self.load_banned_words_cache()
+        warmed = time.perf_counter()
+        
+        if self._banned_words_sync and self._banned_words_sync_interval > 0:
+            threading.Thread(target=self._banned_words_sync_loop, name="banned-words-sync", daemon=True).start()
+        
+        logger.info(
+            f"DatabaseManager initialized in {(warmed - started) * 1000:.0f}ms "
+            f"(client {(client_ready - started) * 1000:.0f}ms, "
+            f"seed check {(seeded - client_ready) * 1000:.0f}ms, "
+            f"banned words cache {(warmed - seeded) * 1000:.0f}ms)"
+        )
+    
+    def _connect(self):
+        """Create the Supabase client"""
         self.url = os.getenv("SUPABASE_URL")
         self.key = os.getenv("SUPABASE_KEY")
         
@@ -25,11 +143,11 @@ class DatabaseManager:
             raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env file")
         
         self.client: Client = create_client(self.url, self.key)
-        self.initialize_default_banned_words() 
-        self.banned_words_cache: List[str] = []
-        self._cache_loaded = False
         
-        logger.info("DatabaseManager initialized")
+        # Atomic warn increments via RPC (disabled if the function is missing)
+        self._warn_rpc_available = os.getenv("WARN_RPC", "1") != "0"
+        # Delta sync of banned words (needs sql/banned_words_sync.sql)
+        self._banned_words_sync = True
     
     # ==================== User Management ====================
     
@@ -50,6 +168,8 @@ class DatabaseManager:
             
             if response.data:
                 logger.info(f"User {user_id} already exists")
+                with self._users_lock:
+                    self._remember_user(user_id)
                 return response.data[0]
             
             # Create new user
@@ -59,6 +179,8 @@ class DatabaseManager:
                 "warn_count": 0
             }
             response = self.client.table("users").insert(new_user).execute()
+            with self._users_lock:
+                self._remember_user(user_id)
             logger.info(f"User {user_id} initialized successfully")
             return response.data[0] if response.data else None
             
@@ -66,23 +188,180 @@ class DatabaseManager:
             logger.error(f"Error initializing user {user_id}: {e}")
             return None
     
+    def ensure_user(self, user_id: int, username: str) -> bool:
+        """
+        Register a user without touching the database on the hot path.
+        
+        Known users are answered from the in-memory LRU; new users are queued
+        and written by the background flusher in batched upserts.
+        
+        Args:
+            user_id: Telegram user ID
+            username: Telegram username
+            
+        Returns:
+            True if the user was already known, False if newly queued
+        """
+        with self._users_lock:
+            if user_id in self._known_users:
+                self._known_users.move_to_end(user_id)
+                return True
+            
+            self._remember_user(user_id)
+            self._pending_users[user_id] = {
+                "user_id": user_id,
+                "username": username,
+                "warn_count": 0
+            }
+            if len(self._pending_users) >= self._user_flush_batch:
+                self._user_flush_event.set()
+        return False
+    
+    def _remember_user(self, user_id: int):
+        """Add a user to the known-user LRU, evicting the least recently seen"""
+        self._known_users[user_id] = None
+        self._known_users.move_to_end(user_id)
+        while len(self._known_users) > self._known_users_max:
+            self._known_users.popitem(last=False)
+    
+    def warm_known_users(self) -> int:
+        """
+        Load existing user IDs into the known-user LRU (page by page).
+        
+        Returns:
+            Number of users loaded
+        """
+        page_size = 1000
+        loaded = 0
+        try:
+            while loaded < self._known_users_max:
+                response = self.client.table("users").select("user_id").range(
+                    loaded, loaded + page_size - 1
+                ).execute()
+                with self._users_lock:
+                    for item in response.data:
+                        if item["user_id"] not in self._known_users:
+                            self._remember_user(item["user_id"])
+                loaded += len(response.data)
+                if len(response.data) < page_size:
+                    break
+            logger.info(f"Warmed known-user cache with {loaded} users")
+        except Exception as e:
+            logger.error(f"Error warming known-user cache: {e}")
+        return loaded
+    
+    def flush_pending_users(self) -> int:
+        """
+        Write queued new users in one batched upsert.
+        Existing rows are left untouched (ignore_duplicates), so warn counts survive.
+        
+        Returns:
+            Number of users written
+        """
+        with self._users_lock:
+            if not self._pending_users:
+                return 0
+            batch = self._pending_users
+            self._pending_users = {}
+        
+        try:
+            self.client.table("users").upsert(
+                list(batch.values()), on_conflict="user_id", ignore_duplicates=True
+            ).execute()
+            logger.info(f"Flushed {len(batch)} new users")
+            return len(batch)
+        except Exception as e:
+            logger.error(f"Error flushing {len(batch)} new users: {e}")
+            # Put them back for the next round (newer entries win)
+            with self._users_lock:
+                batch.update(self._pending_users)
+                self._pending_users = batch
+            return 0
+    
+    def _user_flush_loop(self):
+        """Background thread: warm the known-user cache, then flush new users periodically"""
+        self.warm_known_users()
+        while True:
+            self._user_flush_event.wait(self._user_flush_interval)
+            self._user_flush_event.clear()
+            self.flush_pending_users()
+    
     def add_warn(self, user_id: int) -> Optional[int]:
         """
         Increment the warn count for a user.
         
+        Uses the atomic increment_warn RPC (one round trip, no lost updates
+        under concurrency) and falls back to read-modify-write when the
+        function is not installed.
+        
         Args:
             user_id: Telegram user ID
             
         Returns:
             Updated warn count or None if error
         """
+        if self._warn_rpc_available:
+            new_warn_count = self._add_warn_rpc(user_id)
+            if new_warn_count is not None or self._warn_rpc_available:
+                # A failed call (e.g. a timeout) may still have committed on the
+                # server: falling back could count the warn twice
+                return new_warn_count
+        
+        return self._add_warn_fallback(user_id)
+    
+    def _pending_username(self, user_id: int) -> str:
+        """Username of a queued registration (if any), left queued until the warn succeeds"""
+        with self._users_lock:
+            pending = self._pending_users.get(user_id)
+        return pending["username"] if pending else "unknown"
+    
+    def _drop_pending_user(self, user_id: int):
+        """The user row now exists: no need to flush its registration"""
+        with self._users_lock:
+            self._pending_users.pop(user_id, None)
+    
+    def _add_warn_rpc(self, user_id: int) -> Optional[int]:
+        """Single-round-trip warn via the increment_warn Postgres function (sql/increment_warn.sql)"""
+        try:
+            response = self.client.rpc("increment_warn", {
+                "p_user_id": user_id,
+                "p_username": self._pending_username(user_id)
+            }).execute()
+            
+            data = response.data
+            if isinstance(data, list):
+                data = data[0] if data else None
+            if isinstance(data, dict):
+                data = data.get("increment_warn", data.get("warn_count"))
+            new_warn_count = int(data)
+            
+            self._drop_pending_user(user_id)
+            with self._users_lock:
+                self._remember_user(user_id)
+            logger.info(f"User {user_id} warned. New warn count: {new_warn_count}")
+            return new_warn_count
+            
+        except Exception as e:
+            message = str(e)
+            # PGRST202: not in PostgREST's schema cache, 42883: undefined function
+            if "PGRST202" in message or "42883" in message:
+                # Function missing on this database: stop trying it
+                self._warn_rpc_available = False
+                logger.warning(f"increment_warn RPC unavailable, using read-modify-write warns: {e}")
+            else:
+                logger.error(f"Error in increment_warn RPC for user {user_id}: {e}")
+            return None
+    
+    def _add_warn_fallback(self, user_id: int) -> Optional[int]:
+        """Read-modify-write warn increment (up to four round trips, not atomic)"""
         try:
             # First, ensure user exists
             user = self.client.table("users").select("warn_count").eq("user_id", user_id).execute()
             
             if not user.data:
                 logger.warning(f"User {user_id} not found, initializing with 1 warn")
-                self.initialize_user(user_id, "unknown")
+                if self.initialize_user(user_id, self._pending_username(user_id)):
+                    self._drop_pending_user(user_id)
             
             # Increment warn count
             current_warns = user.data[0]["warn_count"] if user.data else 0
@@ -156,9 +435,12 @@ class DatabaseManager:
             True if successful, False otherwise
         """
         try:
-            response = self.client.table("banned_words").select("word").execute()
+            rows = self._select_banned_words()
             
-            self.banned_words_cache = [item["word"].lower() for item in response.data]
+            self.banned_words_cache = [item["word"].lower() for item in rows]
+            self.banned_words_matcher.build(self.banned_words_cache)
+            self._advance_watermark(rows)
+            self.banned_words_version += 1
             self._cache_loaded = True
             
             logger.info(f"Loaded {len(self.banned_words_cache)} banned words into cache")
@@ -169,18 +451,147 @@ class DatabaseManager:
             self.banned_words_cache = []
             return False
     
+    def _select_banned_words(self) -> List[dict]:
+        """All live banned word rows (falls back to the pre-sync schema)"""
+        if self._banned_words_sync:
+            try:
+                return self.client.table("banned_words").select("word, updated_at").eq(
+                    "is_deleted", False
+                ).execute().data
+            except Exception as e:
+                if not _is_missing_schema(e):
+                    raise  # Transient: this load fails (and is retried), sync stays on
+                self._banned_words_sync = False
+                logger.warning(f"banned_words has no updated_at/is_deleted columns, cross-instance sync disabled: {e}")
+        
+        return self.client.table("banned_words").select("word").execute().data
+    
+    def _advance_watermark(self, rows: List[dict]):
+        for item in rows:
+            stamp = item.get("updated_at")
+            if not stamp:
+                continue
+            stamp = datetime.fromisoformat(stamp.replace("Z", "+00:00"))
+            if stamp > self._banned_words_watermark:
+                self._banned_words_watermark = stamp
+    
+    def _cache_add_word(self, word: str) -> bool:
+        """Add a word to the cache and matcher; True if it was new"""
+        if word in self.banned_words_matcher:
+            return False
+        self.banned_words_cache.append(word)
+        self.banned_words_matcher.add(word)
+        self.banned_words_version += 1
+        return True
+    
+    def _cache_remove_word(self, word: str) -> bool:
+        """Remove a word from the cache and matcher; True if it was present"""
+        if word not in self.banned_words_matcher:
+            return False
+        if word in self.banned_words_cache:
+            self.banned_words_cache.remove(word)
+        self.banned_words_matcher.remove(word)
+        self.banned_words_version += 1
+        return True
+    
+    def sync_banned_words(self) -> int:
+        """
+        Apply banned word changes made by other instances since the last sync.
+        
+        Only rows whose updated_at is past the watermark are fetched; removed
+        words arrive as is_deleted tombstones. Rows are re-read with a small
+        overlap (commits can land slightly out of timestamp order) and applied
+        idempotently.
+        
+        Returns:
+            Number of cache changes applied, or None if the sync query failed
+        """
+        if not self._banned_words_sync:
+            return 0
+        
+        try:
+            since = self._banned_words_watermark - timedelta(seconds=5)
+            response = self.client.table("banned_words").select("word, is_deleted, updated_at").gte(
+                "updated_at", since.isoformat()
+            ).order("updated_at").execute()
+            
+            changes = 0
+            for item in response.data:
+                word = item["word"].lower()
+                if item.get("is_deleted"):
+                    changes += self._cache_remove_word(word)
+                else:
+                    changes += self._cache_add_word(word)
+            self._advance_watermark(response.data)
+            
+            if changes:
+                logger.info(f"Synced {changes} banned word change(s) from other instances")
+            return changes
+            
+        except Exception as e:
+            if _is_missing_schema(e):
+                self._banned_words_sync = False
+                logger.warning(f"banned_words sync columns are missing, cross-instance sync disabled: {e}")
+                return 0
+            logger.error(f"Error syncing banned words: {e}")
+            return None
+    
+    def _banned_words_sync_loop(self):
+        """Background thread: poll for banned word changes, backing off while the query fails"""
+        failures = 0
+        while self._banned_words_sync:
+            time.sleep(min(self._banned_words_sync_interval * 2 ** failures, 600))
+            if self.sync_banned_words() is None:
+                failures = min(failures + 1, 5)
+            else:
+                failures = 0
+    
+    def _reload_if_unloaded(self):
+        """
+        The startup load failed: retry it on a background thread (at most
+        every 30s). Callers are on the event loop and never wait for it;
+        until it succeeds they see the (empty) in-memory list.
+        """
+        if self._cache_loaded:
+            return
+        with self._reload_lock:
+            now = time.monotonic()
+            if self._reload_running or now - self._last_reload_attempt < 30:
+                return
+            self._reload_running = True
+            self._last_reload_attempt = now
+        
+        def reload():
+            try:
+                self.load_banned_words_cache()
+            finally:
+                self._reload_running = False
+        
+        threading.Thread(target=reload, name="banned-words-reload", daemon=True).start()
+    
     def get_banned_words(self) -> List[str]:
         """
-        Get cached list of banned words. Loads from database if cache is empty.
+        Get cached list of banned words (never blocks; see _reload_if_unloaded).
         
         Returns:
             List of banned words
         """
-        if not self._cache_loaded or not self.banned_words_cache:
-            self.load_banned_words_cache()
-        
+        self._reload_if_unloaded()
         return self.banned_words_cache
     
+    def find_banned_word(self, text: str) -> Optional[WordMatch]:
+        """
+        Find the first banned word in text using the compiled matcher.
+        
+        Args:
+            text: Message text
+            
+        Returns:
+            WordMatch (word and span in text) or None
+        """
+        self._reload_if_unloaded()
+        return self.banned_words_matcher.search(text)
+    
     def initialize_default_banned_words(self) -> bool:
         """
         Initialize database with default Persian banned words if empty.
@@ -196,66 +607,18 @@ class DatabaseManager:
                 logger.info("Banned words already exist in database")
                 return True
             
-            # Default Persian spam and profanity words
-            default_words = [
-                # Spam/Advertising words
-                "تبلیغ",
-                "صیغه",
-                "لینک",
-                "فروش",
-                "خرید",
-                "کسب درآمد",
-                "کار در خانه",
-                "کریپتو",
-                "بیت کوین",
-                # Profanity and explicit words
-                "کون",
-                "کونی",
-                "کونکش",
-                "کون گشاد",
-                "کص",
-                "کصکش",
-                "کص کش",
-                "کیر",
-                "دودول",
-                "خایه",
-                "گوه",
-                "عن",
-                "کون کش",
-                "کس کش",
-                "کسکش",
-                "بیشرف",
-                "قهبه",
-                "جنده",
-                "ناموس",
-                "بیناموس",
-                "بی ناموس",
-                "گاییدم",
-                "گایید",
-                "کیرم",
-                "کیرت",
-                "گاییدن",
-                "گایش",
-                "مادرتو",
-                "ننتو",
-                "مامانتو",
-                "حرومزاده",
-                "حرامزاده",
-                "حروم زاده",
-                "حرام زاده",
-                "بیخایه",
-                "بی خایه"
-            ]
-            
-            # Insert default words
-            for word in default_words:
-                self.client.table("banned_words").insert({
-                    "word": word.lower()
-                }).execute()
-            
-            # Reload cache
-            self.load_banned_words_cache()
-            logger.info(f"Initialized {len(default_words)} default banned words")
+            # Insert default words in one request; re-running is a no-op
+            rows = [{"word": word} for word in dict.fromkeys(w.lower() for w in DEFAULT_BANNED_WORDS)]
+            try:
+                self.client.table("banned_words").upsert(
+                    rows, on_conflict="word", ignore_duplicates=True
+                ).execute()
+            except Exception as e:
+                # No unique constraint on word (see sql/banned_words.sql): plain bulk insert
+                logger.warning(f"Bulk upsert of default banned words failed ({e}), inserting instead")
+                self.client.table("banned_words").insert(rows).execute()
+            
+            logger.info(f"Initialized {len(rows)} default banned words")
             return True
             
         except Exception as e:
@@ -276,19 +639,26 @@ class DatabaseManager:
             word_lower = word.lower()
             
             # Check if word already exists
-            response = self.client.table("banned_words").select("word").eq("word", word_lower).execute()
+            columns = "word, is_deleted" if self._banned_words_sync else "word"
+            response = self.client.table("banned_words").select(columns).eq("word", word_lower).execute()
             
-            if response.data:
+            if response.data and not response.data[0].get("is_deleted"):
                 logger.info(f"Word '{word}' already in banned list")
                 return response.data[0]
             
-            # Add new banned word
-            new_word = {"word": word_lower}
-            response = self.client.table("banned_words").insert(new_word).execute()
+            if response.data:
+                # Revive a tombstoned word (bumps updated_at for other instances)
+                response = self.client.table("banned_words").update(
+                    {"is_deleted": False}
+                ).eq("word", word_lower).execute()
+            else:
+                # Add new banned word
+                new_word = {"word": word_lower}
+                response = self.client.table("banned_words").insert(new_word).execute()
             
             # Update cache
             if response.data:
-                self.banned_words_cache.append(word_lower)
+                self._cache_add_word(word_lower)
                 logger.info(f"Added '{word}' to banned words")
             
             return response.data[0] if response.data else None
@@ -310,11 +680,14 @@ class DatabaseManager:
         try:
             word_lower = word.lower()
             
-            self.client.table("banned_words").delete().eq("word", word_lower).execute()
+            if self._banned_words_sync:
+                # Tombstone so other instances see the removal in their delta fetch
+                self.client.table("banned_words").update({"is_deleted": True}).eq("word", word_lower).execute()
+            else:
+                self.client.table("banned_words").delete().eq("word", word_lower).execute()
             
             # Update cache
-            if word_lower in self.banned_words_cache:
-                self.banned_words_cache.remove(word_lower)
+            self._cache_remove_word(word_lower)
             
             logger.info(f"Removed '{word}' from banned words")
             return True
@@ -332,6 +705,389 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error resetting warns: {e}")
             return False
+    
+    # ==================== Media Verdicts ====================
+    
+    def get_media_verdict(self, file_unique_id: str) -> Optional[dict]:
+        """
+        Look up a stored verdict for a Telegram file (sql/media_verdicts.sql).
+        
+        Args:
+            file_unique_id: Telegram's stable file identifier
+            
+        Returns:
+            {"action": "ALLOW"|"BLOCK", "reason": str} or None
+        """
+        try:
+            response = self.client.table("media_verdicts").select("action, reason").eq(
+                "file_unique_id", file_unique_id
+            ).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error getting media verdict for {file_unique_id}: {e}")
+            return None
+    
+    def save_media_verdict(self, file_unique_id: str, action: str, reason: str, phash: Optional[int] = None) -> bool:
+        """
+        Store (or replace) the verdict for a Telegram file.
+        
+        Args:
+            phash: Signed 64-bit perceptual hash of the image (or its thumbnail), if known
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            row = {
+                "file_unique_id": file_unique_id,
+                "action": action,
+                "reason": reason
+            }
+            if phash is not None:
+                row["phash"] = phash
+            self.client.table("media_verdicts").upsert(row, on_conflict="file_unique_id").execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error saving media verdict for {file_unique_id}: {e}")
+            return False
+    
+    def get_blocked_phashes(self) -> List[dict]:
+        """
+        Perceptual hashes of all blocked media (for the near-duplicate index).
+        
+        Returns:
+            List of {"phash": int, "reason": str}
+        """
+        page_size = 1000
+        rows: List[dict] = []
+        try:
+            while True:
+                response = self.client.table("media_verdicts").select("phash, reason").eq(
+                    "action", "BLOCK"
+                ).not_.is_("phash", "null").range(len(rows), len(rows) + page_size - 1).execute()
+                rows.extend(response.data)
+                if len(response.data) < page_size:
+                    return rows
+        except Exception as e:
+            logger.error(f"Error loading blocked media hashes: {e}")
+            return rows
+
+    
+    # ==================== Sticker Sets ====================
+    
+    def get_sticker_set(self, set_name: str):
+        """
+        Look up a sticker pack's verdict and per-sticker tallies (sql/sticker_sets.sql).
+        
+        Returns:
+            {"set_name", "action": "ALLOW"|"BLOCK"|None, "source", "allow_count", "block_count"},
+            None if the pack is unknown, or DB_ERROR if the lookup failed
+        """
+        try:
+            response = self.client.table("sticker_sets").select(
+                "set_name, action, source, allow_count, block_count"
+            ).eq("set_name", set_name).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error getting sticker set {set_name}: {e}")
+            return DB_ERROR
+    
+    def record_sticker_verdict(self, set_name: str, action: str, promote_threshold: int) -> Optional[dict]:
+        """
+        Count one sticker's verdict towards its pack, server-side (record_sticker_verdict()
+        in sql/sticker_sets.sql). A pack without an action gets `action` (source 'auto')
+        once it has `promote_threshold` such verdicts and none of the other kind.
+        
+        Returns:
+            The updated pack row, or None on error
+        """
+        try:
+            response = self.client.rpc("record_sticker_verdict", {
+                "p_set_name": set_name,
+                "p_action": action,
+                "p_threshold": promote_threshold,
+            }).execute()
+            data = response.data
+            if isinstance(data, list):
+                data = data[0] if data else None
+            return data
+        except Exception as e:
+            logger.error(f"Error recording sticker verdict for {set_name}: {e}")
+            return None
+    
+    def set_sticker_set_action(self, set_name: str, action: Optional[str], source: Optional[str]) -> bool:
+        """
+        Set (or with action=None, clear) a pack's verdict; the tallies are left as they are.
+        
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            self.client.table("sticker_sets").upsert(
+                {"set_name": set_name, "action": action, "source": source}, on_conflict="set_name"
+            ).execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error saving sticker set {set_name}: {e}")
+            return False
+
+    
+    # ==================== Approval Queue ====================
+    
+    def save_pending_approval(self, row: dict) -> bool:
+        """
+        Store a media item waiting for manual approval (sql/pending_approvals.sql).
+        
+        Args:
+            row: {"message_id", "chat_id", "user_id", "file_unique_id", "sticker_set", "phash", "created_at"}
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            self.client.table("pending_approvals").upsert(row, on_conflict="message_id").execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error saving pending approval {row.get('message_id')}: {e}")
+            return False
+    
+    def get_pending_approval(self, message_id: int) -> Optional[dict]:
+        try:
+            response = self.client.table("pending_approvals").select("*").eq("message_id", message_id).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error getting pending approval {message_id}: {e}")
+            return None
+    
+    def get_pending_approvals(self, since: int) -> List[dict]:
+        """All pending approvals created at or after `since` (unix time), oldest first"""
+        try:
+            response = self.client.table("pending_approvals").select("*").gte(
+                "created_at", since
+            ).order("created_at").execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error loading pending approvals: {e}")
+            return []
+    
+    def delete_pending_approvals(self, message_ids: List[int]) -> bool:
+        if not message_ids:
+            return True
+        try:
+            self.client.table("pending_approvals").delete().in_("message_id", message_ids).execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting pending approvals: {e}")
+            return False
+    
+    def delete_expired_approvals(self, before: int) -> bool:
+        """Drop pending approvals created before `before` (unix time)"""
+        try:
+            self.client.table("pending_approvals").delete().lt("created_at", before).execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting expired approvals: {e}")
+            return False
+
+    
+    # ==================== Scheduled Deletions ====================
+    
+    def save_scheduled_deletions(self, rows: List[dict]) -> bool:
+        """
+        Persist pending message deletions in one batched upsert (sql/scheduled_deletions.sql).
+        
+        Args:
+            rows: [{"chat_id", "message_id", "due_at"}] with due_at in unix time
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not rows:
+            return True
+        try:
+            self.client.table("scheduled_deletions").upsert(rows, on_conflict="chat_id,message_id").execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error saving {len(rows)} scheduled deletions: {e}")
+            return False
+    
+    def get_scheduled_deletions(self) -> List[dict]:
+        try:
+            return self.client.table("scheduled_deletions").select("chat_id, message_id, due_at").execute().data
+        except Exception as e:
+            logger.error(f"Error loading scheduled deletions: {e}")
+            return []
+    
+    def delete_scheduled_deletions(self, due_before: float) -> bool:
+        """Drop every scheduled deletion due at or before `due_before` (already carried out)"""
+        try:
+            self.client.table("scheduled_deletions").delete().lte("due_at", due_before).execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error clearing scheduled deletions: {e}")
+            return False
+
+
+class AsyncDatabaseManager:
+    """
+    Awaitable facade over DatabaseManager.
+    
+    Blocking Supabase calls run on a dedicated, bounded thread pool with a
+    concurrency limit and a per-call timeout, so one slow response never
+    stalls update processing. On timeout or error the same "failed" value
+    as the synchronous method (None/False) is returned.
+    """
+    
+    def __init__(self, manager: DatabaseManager):
+        self.db = manager
+        self.timeout = float(os.getenv("DB_CALL_TIMEOUT", "10"))
+        max_workers = int(os.getenv("DB_MAX_WORKERS", "8"))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        # Callers beyond the limit wait here instead of piling up in the executor queue
+        self._semaphore = asyncio.Semaphore(int(os.getenv("DB_MAX_CONCURRENCY", str(max_workers * 2))))
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.in_flight = 0
+        metrics.register("database", self.stats)
+    
+    async def _call(self, func, *args, default=None):
+        """Run a blocking DatabaseManager method in the pool, bounded by timeout"""
+        # The slot is released when the worker thread finishes, not when we stop
+        # waiting, so timed-out calls can't pile up beyond the limit
+        await self._semaphore.acquire()
+        self.calls += 1
+        self.in_flight += 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._executor, functools.partial(func, *args))
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.error(f"Database call {func.__name__} timed out after {self.timeout}s")
+            return default
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Database call {func.__name__} failed: {e}")
+            return default
+    
+    def _release(self, future=None):
+        self.in_flight -= 1
+        self._semaphore.release()
+        if future is not None and not future.cancelled():
+            future.exception()  # Retrieved, even if nobody awaited it any more
+    
+    async def ensure_banned_words_loaded(self) -> bool:
+        """Load the banned word cache if the load in __init__ failed (startup, off the event loop)"""
+        if self.db._cache_loaded:
+            return True
+        return await self.load_banned_words_cache()
+    
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+        }
+    
+    # ==================== User Management ====================
+    
+    async def initialize_user(self, user_id: int, username: str) -> Optional[dict]:
+        return await self._call(self.db.initialize_user, user_id, username)
+    
+    async def add_warn(self, user_id: int) -> Optional[int]:
+        return await self._call(self.db.add_warn, user_id)
+    
+    async def get_user_stats(self, user_id: int) -> Optional[dict]:
+        return await self._call(self.db.get_user_stats, user_id)
+    
+    async def get_user_id_by_username(self, username: str) -> Optional[int]:
+        return await self._call(self.db.get_user_id_by_username, username)
+    
+    async def reset_warns(self, user_id: int) -> bool:
+        return await self._call(self.db.reset_warns, user_id, default=False)
+    
+    # ==================== Banned Words Management ====================
+    
+    async def load_banned_words_cache(self) -> bool:
+        return await self._call(self.db.load_banned_words_cache, default=False)
+    
+    async def add_banned_word(self, word: str) -> Optional[dict]:
+        return await self._call(self.db.add_banned_word, word)
+    
+    async def remove_banned_word(self, word: str) -> bool:
+        return await self._call(self.db.remove_banned_word, word, default=False)
+    
+    # ==================== Media Verdicts ====================
+    
+    async def get_media_verdict(self, file_unique_id: str) -> Optional[dict]:
+        return await self._call(self.db.get_media_verdict, file_unique_id)
+    
+    async def save_media_verdict(self, file_unique_id: str, action: str, reason: str, phash: Optional[int] = None) -> bool:
+        return await self._call(self.db.save_media_verdict, file_unique_id, action, reason, phash, default=False)
+    
+    async def get_blocked_phashes(self) -> List[dict]:
+        return await self._call(self.db.get_blocked_phashes, default=[])
+    
+    # ==================== Sticker Sets ====================
+    
+    async def get_sticker_set(self, set_name: str):
+        return await self._call(self.db.get_sticker_set, set_name, default=DB_ERROR)
+    
+    async def record_sticker_verdict(self, set_name: str, action: str, promote_threshold: int) -> Optional[dict]:
+        return await self._call(self.db.record_sticker_verdict, set_name, action, promote_threshold)
+    
+    async def set_sticker_set_action(self, set_name: str, action: Optional[str], source: Optional[str]) -> bool:
+        return await self._call(self.db.set_sticker_set_action, set_name, action, source, default=False)
+    
+    # ==================== Approval Queue ====================
+    
+    async def save_pending_approval(self, row: dict) -> bool:
+        return await self._call(self.db.save_pending_approval, row, default=False)
+    
+    async def get_pending_approval(self, message_id: int) -> Optional[dict]:
+        return await self._call(self.db.get_pending_approval, message_id)
+    
+    async def get_pending_approvals(self, since: int) -> List[dict]:
+        return await self._call(self.db.get_pending_approvals, since, default=[])
+    
+    async def delete_pending_approvals(self, message_ids: List[int]) -> bool:
+        return await self._call(self.db.delete_pending_approvals, message_ids, default=False)
+    
+    async def delete_expired_approvals(self, before: int) -> bool:
+        return await self._call(self.db.delete_expired_approvals, before, default=False)
+    
+    # ==================== Scheduled Deletions ====================
+    
+    async def save_scheduled_deletions(self, rows: List[dict]) -> bool:
+        return await self._call(self.db.save_scheduled_deletions, rows, default=False)
+    
+    async def get_scheduled_deletions(self) -> List[dict]:
+        return await self._call(self.db.get_scheduled_deletions, default=[])
+    
+    async def delete_scheduled_deletions(self, due_before: float) -> bool:
+        return await self._call(self.db.delete_scheduled_deletions, due_before, default=False)
+
+
+def create_database_manager() -> DatabaseManager:
+    """Build the storage backend selected by DATABASE_BACKEND (supabase | sqlite)"""
+    backend = os.getenv("DATABASE_BACKEND", "supabase").strip().lower()
+    if backend == "sqlite":
+        from src.sqlite_database import SQLiteDatabaseManager
+        return SQLiteDatabaseManager()
+    if backend != "supabase":
+        raise ValueError(f"Unknown DATABASE_BACKEND '{backend}' (expected 'supabase' or 'sqlite')")
+    return DatabaseManager()
+
 
 # Initialize database manager instance
-db = DatabaseManager()
+db = create_database_manager()
+
+# Non-blocking API for async handlers
+async_db = AsyncDatabaseManager(db)
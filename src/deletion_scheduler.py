@@ -0,0 +1,262 @@
+"""
+Message deletion: delayed (flash messages) and coalesced (spam floods)
+Delayed deletions share one persisted timer heap; spam deletions are
+batched per chat into bulk deleteMessages calls
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from src.database import async_db
+from src.send_queue import SEND_QUEUE
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_BULK_DELETE = 100  # Bot API limit for deleteMessages
+
+
+async def delete_batch(bot, chat_id: int, message_ids: List[int]) -> int:
+    """
+    Delete messages of one chat with deleteMessages (100 IDs per call).
+
+    Calls go through SEND_QUEUE, so they are rate-limited and flood control
+    (RetryAfter) is waited out and retried. Only a chunk whose bulk call
+    fails for another reason (e.g. a message that can't be deleted) falls
+    back to single deletes.
+
+    Returns:
+        Number of messages deleted
+    """
+    deleted = 0
+    for start in range(0, len(message_ids), MAX_BULK_DELETE):
+        chunk = message_ids[start:start + MAX_BULK_DELETE]
+        try:
+            if len(chunk) == 1:
+                done = await SEND_QUEUE.call(
+                    chat_id, bot.delete_message, chat_id=chat_id, message_id=chunk[0], chat_limited=False
+                )
+            else:
+                done = await SEND_QUEUE.call(
+                    chat_id, bot.delete_messages, chat_id=chat_id, message_ids=chunk, chat_limited=False
+                )
+            if done:  # None: still flood-limited after the retries, don't multiply the calls
+                deleted += len(chunk)
+            continue
+        except Exception as e:
+            if len(chunk) == 1:
+                continue  # Already deleted by someone else, or no rights
+            logger.warning(f"Bulk delete of {len(chunk)} messages in {chat_id} failed ({e}), deleting one by one")
+
+        results = await asyncio.gather(
+            *(
+                SEND_QUEUE.call(chat_id, bot.delete_message, chat_id=chat_id, message_id=message_id, chat_limited=False)
+                for message_id in chunk
+            ),
+            return_exceptions=True
+        )
+        deleted += sum(1 for result in results if result is True)
+    return deleted
+
+
+class DeletionScheduler:
+    """
+    Deletes messages when they come due.
+
+    schedule() is a cheap, synchronous push onto a heap ordered by due
+    time; a single task sleeps until the earliest entry is due (woken early
+    when an earlier one arrives). New entries are written to the database
+    in batches, and rows are cleared by due time once their deletions have
+    run, so a restart picks up exactly the deletions still pending.
+    """
+
+    def __init__(self, flush_interval: float = 1.0):
+        self.flush_interval = flush_interval
+        self._heap: List[Tuple[float, int, int]] = []  # (due_at, chat_id, message_id)
+        self._unsaved: Dict[Tuple[int, int], float] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._bot = None
+        self.scheduled = 0
+        self.deleted = 0
+        self.failed = 0
+
+    def schedule(self, chat_id: int, message_id: int, delay: float):
+        """Delete a message after `delay` seconds"""
+        due_at = time.time() + delay
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (due_at, chat_id, message_id))
+        self._unsaved[(chat_id, message_id)] = due_at
+        self.scheduled += 1
+        if self._wakeup and (earliest is None or due_at < earliest):
+            self._wakeup.set()
+
+    async def start(self, bot):
+        """Load persisted deletions and start the timer task (call once the bot is initialized)"""
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        rows = await async_db.get_scheduled_deletions()
+        for row in rows:
+            heapq.heappush(self._heap, (row["due_at"], row["chat_id"], row["message_id"]))
+        logger.info(f"Deletion scheduler started ({len(rows)} pending deletions restored)")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the timer task and persist anything not yet saved"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Deletion scheduler error: {e}")
+                await asyncio.sleep(self.flush_interval)
+
+    async def _tick(self):
+        timeout = self.flush_interval
+        if self._heap:
+            timeout = min(timeout, max(0.0, self._heap[0][0] - time.time()))
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        now = time.time()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, chat_id, message_id = heapq.heappop(self._heap)
+            self._unsaved.pop((chat_id, message_id), None)  # Never needs to be persisted
+            due.append((due_at, chat_id, message_id))
+
+        await self._flush()
+        if due:
+            await self._execute(due)
+            await async_db.delete_scheduled_deletions(due[-1][0])
+
+    async def _flush(self):
+        if not self._unsaved:
+            return
+        batch = self._unsaved
+        self._unsaved = {}
+        rows = [
+            {"chat_id": chat_id, "message_id": message_id, "due_at": due_at}
+            for (chat_id, message_id), due_at in batch.items()
+        ]
+        if not await async_db.save_scheduled_deletions(rows):
+            # Retry next round (entries scheduled meanwhile win)
+            batch.update(self._unsaved)
+            self._unsaved = batch
+
+    async def _execute(self, due: List[Tuple[float, int, int]]):
+        by_chat: Dict[int, List[int]] = {}
+        for _, chat_id, message_id in due:
+            by_chat.setdefault(chat_id, []).append(message_id)
+        results = await asyncio.gather(
+            *(delete_batch(self._bot, chat_id, message_ids) for chat_id, message_ids in by_chat.items()),
+            return_exceptions=True
+        )
+        deleted = sum(result for result in results if isinstance(result, int))
+        self.deleted += deleted
+        self.failed += len(due) - deleted  # Already deleted by someone else, or no rights
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._heap),
+            "unsaved": len(self._unsaved),
+            "scheduled": self.scheduled,
+            "deleted": self.deleted,
+            "failed": self.failed,
+        }
+
+
+class DeletionCoalescer:
+    """
+    Batches deletions per chat over a short window.
+
+    The first message of a chat starts one timer; every message arriving
+    before it fires joins the same deleteMessages call, and a chat that
+    reaches 100 pending IDs is flushed at once. A flood of N spam messages
+    costs about N/100 API calls instead of N.
+    """
+
+    def __init__(self, window: float = 0.5):
+        self.window = window
+        self._pending: Dict[int, List[int]] = {}
+        self._timers: Dict[int, asyncio.Task] = {}
+        self._flushing = set()  # Strong references to running flush tasks
+        self.requested = 0
+        self.deleted = 0
+        self.batches = 0
+
+    def delete(self, bot, chat_id: int, message_id: int):
+        """Delete a message within `window` seconds, together with the chat's other pending deletions"""
+        message_ids = self._pending.setdefault(chat_id, [])
+        message_ids.append(message_id)
+        self.requested += 1
+        if len(message_ids) >= MAX_BULK_DELETE:
+            timer = self._timers.pop(chat_id, None)
+            if timer:
+                timer.cancel()
+            self._spawn(self._flush(bot, chat_id, self._pending.pop(chat_id)))
+        elif chat_id not in self._timers:
+            self._timers[chat_id] = asyncio.create_task(self._flush_later(bot, chat_id))
+
+    async def _flush_later(self, bot, chat_id: int):
+        await asyncio.sleep(self.window)
+        self._timers.pop(chat_id, None)
+        message_ids = self._pending.pop(chat_id, None)
+        if message_ids:
+            await self._flush(bot, chat_id, message_ids)
+
+    async def _flush(self, bot, chat_id: int, message_ids: List[int]):
+        self.batches += 1
+        try:
+            deleted = await delete_batch(bot, chat_id, message_ids)
+            self.deleted += deleted
+        except Exception as e:
+            logger.error(f"Error deleting {len(message_ids)} messages in {chat_id}: {e}")
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    def stats(self) -> dict:
+        return {
+            "pending": sum(len(ids) for ids in self._pending.values()),
+            "requested": self.requested,
+            "deleted": self.deleted,
+            "batches": self.batches,
+        }
+
+
+DELETIONS = DeletionScheduler(flush_interval=float(os.getenv("DELETION_FLUSH_INTERVAL", "1")))
+metrics.register("deletion_scheduler", DELETIONS.stats)
+
+
+def schedule_delete(chat_id: int, message_id: int, delay: float):
+    """Delete a message after `delay` seconds (survives restarts)"""
+    DELETIONS.schedule(chat_id, message_id, delay)
+
+
+SPAM_DELETIONS = DeletionCoalescer(window=float(os.getenv("DELETE_COALESCE_WINDOW", "0.5")))
+metrics.register("spam_deletions", SPAM_DELETIONS.stats)
+
+
+def delete_soon(bot, chat_id: int, message_id: int):
+    """Delete a spam message in the chat's next bulk deletion (within DELETE_COALESCE_WINDOW)"""
+    SPAM_DELETIONS.delete(bot, chat_id, message_id)
@@ -3,21 +3,13 @@ Command handlers for the Telegram bot (Persian/Farsi)
 """
 
 import logging
-import asyncio
 from telegram import Update
 from telegram.ext import ContextTypes
-from src.database import db
+from src.database import async_db
+from src.deletion_scheduler import schedule_delete
 
 logger = logging.getLogger(__name__)
 
-# Helper for Flash Messages
-async def delete_later(bot, chat_id, message_id, delay):
-    try:
-        await asyncio.sleep(delay)
-        await bot.delete_message(chat_id=chat_id, message_id=message_id)
-    except Exception:
-        pass
-
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command - Detailed Welcome Message"""
     try:
@@ -27,7 +19,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
         
         # Initialize user in database
-        db.initialize_user(user.id, user.username or "Unknown")
+        await async_db.initialize_user(user.id, user.username or "Unknown")
         
         # 🟢 NEW DETAILED WELCOME MESSAGE
         welcome_message = f"""👋 سلام {user.first_name} عزیز!
@@ -59,9 +51,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Auto-delete after 30 seconds if sent in a group (keep chat clean)
         if update.message.chat.type != 'private':
-            asyncio.create_task(delete_later(context.bot, update.message.chat_id, response.message_id, 30))
+            schedule_delete(update.message.chat_id, response.message_id, 30)
             # Delete user's command
-            asyncio.create_task(delete_later(context.bot, update.message.chat_id, update.message.message_id, 30))
+            schedule_delete(update.message.chat_id, update.message.message_id, 30)
             
     except Exception as e:
         logger.error(f"Error in /start command: {e}")
@@ -92,8 +84,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         response = await update.message.reply_text(help_text, parse_mode="HTML")
         
         if update.message.chat.type != 'private':
-            asyncio.create_task(delete_later(context.bot, update.message.chat_id, response.message_id, 20))
-            asyncio.create_task(delete_later(context.bot, update.message.chat_id, update.message.message_id, 20))
+            schedule_delete(update.message.chat_id, response.message_id, 20)
+            schedule_delete(update.message.chat_id, update.message.message_id, 20)
             
     except Exception as e:
         logger.error(f"Error in /help command: {e}")
@@ -106,11 +98,11 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         user = update.effective_user
-        user_stats = db.get_user_stats(user.id)
+        user_stats = await async_db.get_user_stats(user.id)
         
         if not user_stats:
             # If user not found, init them and say 0 warnings
-            db.initialize_user(user.id, user.username or "Unknown")
+            await async_db.initialize_user(user.id, user.username or "Unknown")
             warn_count = 0
         else:
             warn_count = user_stats.get("warn_count", 0)
@@ -133,8 +125,8 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         msg = await update.message.reply_text(response, parse_mode="HTML")
         
         if update.message.chat.type != 'private':
-            asyncio.create_task(delete_later(context.bot, update.message.chat_id, msg.message_id, 15))
-            asyncio.create_task(delete_later(context.bot, update.message.chat_id, update.message.message_id, 15))
+            schedule_delete(update.message.chat_id, msg.message_id, 15)
+            schedule_delete(update.message.chat_id, update.message.message_id, 15)
             
     except Exception as e:
         logger.error(f"Error in /stats command: {e}")
\ No newline at end of file
@@ -2,40 +2,52 @@
 Message handlers for processing group messages (Persian/Farsi)
 """
 
+import os
 import logging
-import re
 import asyncio
-from telegram import Update, ChatMember, ChatPermissions, MessageEntity
+from telegram import Update
 from telegram.ext import ContextTypes
-from src.database import db
-from src.ai_safety import scan_media # 🟢 Import the new AI module
+from src.database import db, async_db
+from src.deletion_scheduler import schedule_delete, delete_soon
+from src.admin_cache import is_admin
+from src.media_scanner import MEDIA_SCANNER # 🟢 Bounded, rate-limited AI scanner
+from src.media_download import spooled_download
+from src.sticker_sets import STICKER_SETS
+from src.approval_queue import APPROVALS # 🟢 Persistent manual approval queue
+from src.send_queue import SEND_QUEUE
+from src.link_detector import detect_link_in_entities, detect_link_in_text
+from src.verdict_cache import VerdictCache, MISS, text_key
+from src.media_cache import MEDIA_VERDICTS, Thumbnail, image_mime, media_fingerprint
+from src import metrics
 
 logger = logging.getLogger(__name__)
 
-# MEMORY for Manual Approval Fallback
-PENDING_APPROVALS = {}
+# Verdicts for repeated texts (raids paste the same message hundreds of times)
+TEXT_VERDICTS = VerdictCache(
+    max_size=int(os.getenv("TEXT_VERDICT_CACHE_SIZE", "5000")),
+    ttl=float(os.getenv("TEXT_VERDICT_CACHE_TTL", "600")),
+)
+metrics.register("text_verdict_cache", TEXT_VERDICTS.stats)
+
+# "tiered": a video too big to download (over 20MB) is judged from its thumbnail
+# instead of going to manual approval; "full": such videos always go to an admin
+VIDEO_SCAN_MODE = os.getenv("VIDEO_SCAN_MODE", "tiered").lower()
 
 # ==================== HELPER FUNCTIONS ====================
 
-async def delete_later(bot, chat_id, message_id, delay):
-    """Wait for 'delay' seconds, then delete the message"""
-    try:
-        await asyncio.sleep(delay)
-        await bot.delete_message(chat_id=chat_id, message_id=message_id)
-    except Exception:
-        pass
+async def remember_verdict(file_unique_id, sticker_set, action: str, reason: str, phash=None):
+    """Store a new media verdict for the file and count it towards its sticker pack"""
+    await MEDIA_VERDICTS.put(file_unique_id, action, reason, phash)
+    await STICKER_SETS.record(sticker_set, action)
 
-async def is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
-    if not update.message or not update.effective_user:
-        return False
-    try:
-        user_status = await update.message.chat.get_member(update.effective_user.id)
-        admin_statuses = [ChatMember.ADMINISTRATOR, ChatMember.OWNER]
-        if hasattr(ChatMember, 'CREATOR'):
-            admin_statuses.append(ChatMember.CREATOR)
-        return user_status.status in admin_statuses
-    except Exception:
-        return False
+async def block_if_similar(file_unique_id, sticker_set, phash):
+    """BLOCK verdict if the media is a near-duplicate of a blocked image (stored for this file too), else None"""
+    similar = await MEDIA_VERDICTS.find_similar(phash)
+    if not similar:
+        return None
+    logger.info(f"Media matches a blocked image (distance {similar['distance']}), blocking without a scan")
+    await remember_verdict(file_unique_id, sticker_set, "BLOCK", similar["reason"], phash)
+    return {"action": "BLOCK", "reason": similar["reason"] or "محتوای نامناسب"}
 
 async def log_spam_event(user_id: int, username: str, spam_type: str, content: str, chat_id: int):
     try:
@@ -44,68 +56,56 @@ async def log_spam_event(user_id: int, username: str, spam_type: str, content: s
         pass
 
 async def handle_punishment(update: Update, context: ContextTypes.DEFAULT_TYPE, user, reason: str):
-    new_warn_count = db.add_warn(user.id)
+    new_warn_count = await async_db.add_warn(user.id)
+    if new_warn_count is None:
+        logger.error(f"Could not record warn for {user.id}, skipping punishment message")
+        return
     user_mention = user.mention_html()
     
     if new_warn_count >= 3:
         try:
-            await context.bot.ban_chat_member(chat_id=update.message.chat_id, user_id=user.id)
+            # 🟢 NEW: Rate-limited and retried on flood control, so raids don't cost bans
+            banned = await SEND_QUEUE.call(
+                update.message.chat_id, context.bot.ban_chat_member,
+                chat_id=update.message.chat_id, user_id=user.id, chat_limited=False
+            )
+            if banned is None:
+                raise RuntimeError("ban_chat_member kept hitting flood control")
             msg_text = f"🚫 کاربر {user_mention} به دلیل {reason} و دریافت ۳ اخطار **مسدود شد**!"
         except Exception:
             msg_text = f"🚫 اخطار سوم برای {user_mention} (ربات دسترسی بن ندارد)."
     else:
         msg_text = f"🚫 {user_mention} عزیز، {reason} مجاز نیست.\n⚠️ اخطار: {new_warn_count}/3"
 
-    warning = await context.bot.send_message(chat_id=update.message.chat_id, text=msg_text, parse_mode="HTML")
-    asyncio.create_task(delete_later(context.bot, update.message.chat_id, warning.message_id, 5))
+    # 🟢 NEW: Merged with other warnings in this chat into one summary message
+    SEND_QUEUE.notify(context.bot, update.message.chat_id, msg_text, delete_after=5)
 
 # ==================== LOGIC: TEXT CLEANING ====================
 
-def normalize_text(text: str) -> str:
-    if not text: return ""
-    clean = re.sub(r'[^\w\d\u0600-\u06FF]', '', text)
-    clean = clean.replace('_', '')
-    clean = re.sub(r'(.)\1+', r'\1', clean)
-    return clean.lower()
-
-def has_link(message) -> bool:
-    entities = message.entities or []
-    caption_entities = message.caption_entities or []
-    all_entities = list(entities) + list(caption_entities)
-    for entity in all_entities:
-        if entity.type in [MessageEntity.URL, MessageEntity.TEXT_LINK]:
-            return True
-
-    text_content = message.text or message.caption or ""
-    text_lower = text_content.lower()
-    
-    # Standard Keywords
-    url_keywords = ['http://', 'https://', 'www.', '.com', '.ir', '.net', '.org', 't.me', 'bit.ly']
-    for keyword in url_keywords:
-        if keyword in text_lower: return True
-
-    # Advanced Skeleton
-    skeleton = re.sub(r'[^a-z]+', '', text_lower)
-    skeleton_clean = re.sub(r'(.)\1+', r'\1', skeleton)
-    
-    extensions = ['com', 'ir', 'net', 'org', 'xyz', 'tk', 'info', 'io', 'me', 'site']
-    common_sites = ['google', 'youtube', 'instagram', 'telegram', 'whatsapp', 'sex', 'porn', 'xxx']
-    prefixes = ['http', 'https', 'www', 'tme']
-
-    for site in common_sites:
-        for ext in extensions:
-            if site + ext in skeleton_clean: return True
-
-    for p in prefixes:
-        if p in skeleton_clean: return True
+def check_text(text: str):
+    """
+    Run the text rules (links, banned words) behind the verdict cache.
+    Returns ("link", rule), ("banned_word", description) or None if clean.
+    """
+    text_lower = text.lower()
+    key = text_key(text_lower)
+    version = db.banned_words_version
+    verdict = TEXT_VERDICTS.get(key, version)
+    if verdict is not MISS:
+        return verdict
+
+    verdict = None
+    link = detect_link_in_text(text)
+    if link:
+        verdict = ("link", link.rule)
+    else:
+        # The original text: the matcher folds case itself and its spans index `text`
+        match = db.find_banned_word(text)
+        if match:
+            verdict = ("banned_word", f"{match.word} ({text[match.start:match.end]})")
 
-    has_symbols = bool(re.search(r'[\./,\\_]', text_lower))
-    if has_symbols:
-        for ext in extensions:
-            if skeleton_clean.endswith(ext):
-                if len(skeleton_clean) > len(ext) + 2:
-                    return True
-    return False
+    TEXT_VERDICTS.put(key, verdict, version)
+    return verdict
 
 # ==================== HANDLER 1: APPROVAL LOGIC ====================
 
@@ -117,7 +117,7 @@ async def handle_approval(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message.reply_to_message: return
 
     target_msg_id = update.message.reply_to_message.message_id
-    data = PENDING_APPROVALS.get(target_msg_id)
+    data = await APPROVALS.get(target_msg_id)
 
     if not data:
         await update.message.reply_text("⚠️ پیام یافت نشد.")
@@ -131,10 +131,11 @@ async def handle_approval(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if command == "تایید":
             await update.message.reply_to_message.copy(
                 chat_id=group_id,
-                caption=f"✅ <b>تایید شد</b>\nتوسط مدیر گروه.",
+                caption="✅ <b>تایید شد</b>\nتوسط مدیر گروه.",
                 parse_mode="HTML"
             )
             await update.message.reply_text("✅ ارسال شد.")
+            await remember_verdict(data.get('file_unique_id'), data.get('sticker_set'), "ALLOW", "تایید دستی مدیر")
             
         elif command == "رد":
             try:
@@ -145,10 +146,11 @@ async def handle_approval(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             reject_msg = f"❌ مدیا ارسالی توسط {user_mention} **تایید نشد**."
             msg = await context.bot.send_message(chat_id=group_id, text=reject_msg, parse_mode="HTML")
-            asyncio.create_task(delete_later(context.bot, group_id, msg.message_id, 10))
+            schedule_delete(group_id, msg.message_id, 10)
             await update.message.reply_text("❌ رد شد.")
+            await remember_verdict(data.get('file_unique_id'), data.get('sticker_set'), "BLOCK", "رد دستی مدیر", data.get('phash'))
 
-        del PENDING_APPROVALS[target_msg_id]
+        await APPROVALS.resolve(target_msg_id)
     except Exception as e:
         logger.error(f"Approval error: {e}")
 
@@ -162,12 +164,23 @@ async def check_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # 1. Determine File and Mime Type
     file_id = None
+    file_unique_id = None # Stable across re-sends, used for the verdict store
+    file_size = None # Reserved against the global media byte budget
+    sticker_set = None # 🟢 NEW: Pack-level verdicts for stickers
     mime_type = "image/jpeg"
+    thumb_only = False # 🟢 NEW: Video too big to download -> scan its thumbnail instead (tiered mode)
+    hash_file = False # 🟢 NEW: Still image -> pHash the downloaded file itself, no thumbnail needed
     
     if message.photo:
         file_id = message.photo[-1].file_id # Best quality
+        file_unique_id = message.photo[-1].file_unique_id
+        file_size = message.photo[-1].file_size
         mime_type = "image/jpeg"
+        hash_file = True
     elif message.sticker:
+        file_unique_id = message.sticker.file_unique_id
+        sticker_set = message.sticker.set_name
+        file_size = message.sticker.file_size
         if message.sticker.is_animated or message.sticker.is_video:
             # Complex stickers might cause issues, ignore or send to fallback
             file_id = message.sticker.file_id
@@ -175,35 +188,77 @@ async def check_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             file_id = message.sticker.file_id
             mime_type = "image/webp"
+            hash_file = True
     elif message.animation:
         file_id = message.animation.file_id
+        file_unique_id = message.animation.file_unique_id
+        file_size = message.animation.file_size
         mime_type = "video/mp4"
     elif message.video:
+        file_unique_id = message.video.file_unique_id
         if message.video.file_size > 20 * 1024 * 1024: # Limit 20MB
-            pass # Too big for AI, go to manual approval
+            # Too big for AI: judge the thumbnail (tiered mode) or go to manual approval
+            thumb_only = VIDEO_SCAN_MODE == "tiered"
         else:
             file_id = message.video.file_id
+            file_size = message.video.file_size
             mime_type = "video/mp4"
 
     # 🟢 2. AI ANALYSIS
-    ai_decision = None
+    # 🟢 NEW: Whole sticker pack allowed/blocked (by an admin or auto-promoted)? No download
+    ai_decision = await STICKER_SETS.get(sticker_set)
+    source = "PACK"
+    
+    # 🟢 NEW: Already judged this exact file? Reuse the verdict (no download, no AI call)
+    if not ai_decision:
+        ai_decision = await MEDIA_VERDICTS.get(file_unique_id)
+        source = "CACHED" if ai_decision else "AI"
     
-    if file_id:
+    # 🟢 NEW: Near-duplicate of a blocked image (64-bit pHash)? Blocked without a scan.
+    # Still images are hashed from the file we download anyway, moving media from
+    # its thumbnail (downloaded at most once per check)
+    thumbnail = Thumbnail(context.bot, message)
+    phash = None
+    if not ai_decision and not hash_file and await MEDIA_VERDICTS.has_blocked_hashes():
+        phash = await thumbnail.fingerprint()
+        ai_decision = await block_if_similar(file_unique_id, sticker_set, phash)
+        if ai_decision:
+            source = "PHASH"
+    
+    # 🟢 NEW: The full file can't be scanned -> the thumbnail's verdict replaces manual approval
+    if thumb_only and not ai_decision and MEDIA_SCANNER.accepting():
+        thumb_bytes = await thumbnail.data()
+        if thumb_bytes:
+            ai_decision = await MEDIA_SCANNER.scan(thumb_bytes, image_mime(thumb_bytes))
+            if ai_decision:
+                source = "AI_THUMB"
+                if ai_decision.get("action") == "BLOCK" and phash is None:
+                    phash = await thumbnail.fingerprint()
+                await remember_verdict(file_unique_id, sticker_set, ai_decision.get("action"), ai_decision.get("reason", ""), phash)
+    
+    # 🟢 NEW: Gemini circuit open -> straight to manual approval, skip the download
+    # (unless a still image can be matched against blocked ones locally)
+    if file_id and not ai_decision and (
+        MEDIA_SCANNER.accepting() or (hash_file and await MEDIA_VERDICTS.has_blocked_hashes())
+    ):
         try:
-            # Download file to memory
-            new_file = await context.bot.get_file(file_id)
-            file_bytes = await new_file.download_as_bytearray()
-            
-            # Send to Gemini
-            banned_words = db.get_banned_words()
-            
-            # Run in separate thread to avoid blocking bot
-            ai_decision = await asyncio.to_thread(
-                scan_media, 
-                bytes(file_bytes), 
-                mime_type, 
-                banned_words
-            )
+            # 🟢 NEW: Stream to a spooled temp file (waits for room in the media byte budget)
+            async with spooled_download(context.bot, file_id, file_size) as media_file:
+                if hash_file:
+                    phash = await media_fingerprint(media_file)
+                    ai_decision = await block_if_similar(file_unique_id, sticker_set, phash)
+                    if ai_decision:
+                        source = "PHASH"
+                if not ai_decision and MEDIA_SCANNER.accepting():
+                    # Send to Gemini (dedicated worker pool, API rate limit and deadline)
+                    ai_decision = await MEDIA_SCANNER.scan(media_file, mime_type)
+            if ai_decision and source == "AI":
+                if ai_decision.get("action") == "BLOCK" and phash is None:
+                    # Hash blocked media so re-encoded copies are recognised next time
+                    phash = await thumbnail.fingerprint()
+                await remember_verdict(file_unique_id, sticker_set, ai_decision.get("action"), ai_decision.get("reason", ""), phash)
+        except asyncio.TimeoutError:
+            logger.warning("Media byte budget full, sending to manual approval")
         except Exception as e:
             logger.error(f"AI Scan Failed: {e}")
             # If AI fails, ai_decision stays None -> Falls back to manual approval
@@ -211,11 +266,11 @@ async def check_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # 🟢 3. AI RESULT HANDLING
     if ai_decision:
         if ai_decision.get("action") == "BLOCK":
-            # AI says it's BAD!
-            await message.delete()
+            # AI says it's BAD! (🟢 NEW: joins the chat's next bulk delete)
+            delete_soon(context.bot, message.chat_id, message.message_id)
             reason = ai_decision.get("reason", "محتوای نامناسب")
             await handle_punishment(update, context, update.effective_user, f"ارسال محتوای نامناسب ({reason})")
-            await log_spam_event(update.effective_user.id, update.effective_user.username, "AI_BLOCK", reason, message.chat.id)
+            await log_spam_event(update.effective_user.id, update.effective_user.username, f"{source}_BLOCK", reason, message.chat.id)
             return
         
         elif ai_decision.get("action") == "ALLOW":
@@ -230,25 +285,31 @@ async def check_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # 🟢 CORRECTED: FORWARD FIRST
         try:
+            if phash is None and not hash_file:
+                # Stored with the item so a rejection also joins the near-duplicate index
+                phash = await thumbnail.fingerprint()
             forwarded_msg = await message.forward(chat_id=OWNER_ID)
-            PENDING_APPROVALS[forwarded_msg.message_id] = {
-                'chat_id': message.chat_id,
-                'user_id': update.effective_user.id
-            }
+            await APPROVALS.add(
+                forwarded_msg.message_id,
+                chat_id=message.chat_id,
+                user_id=update.effective_user.id,
+                file_unique_id=file_unique_id,
+                sticker_set=sticker_set,
+                phash=phash
+            )
             await context.bot.send_message(
                 chat_id=OWNER_ID, 
-                text=f"⚠️ <b>هوش مصنوعی خاموش/خطا</b>\nنیاز به تایید دستی:\nتایید / رد", 
+                text="⚠️ <b>هوش مصنوعی خاموش/خطا</b>\nنیاز به تایید دستی:\nتایید / رد", 
                 parse_mode="HTML"
             )
         except Exception: 
             pass 
 
         # 🟢 CORRECTED: DELETE SECOND
-        await message.delete()
+        delete_soon(context.bot, message.chat_id, message.message_id)
 
         msg_text = f"🔒 {update.effective_user.mention_html()} عزیز، فایل شما برای بررسی ارسال شد."
-        warning = await context.bot.send_message(chat_id=message.chat_id, text=msg_text, parse_mode="HTML")
-        asyncio.create_task(delete_later(context.bot, message.chat_id, warning.message_id, 5))
+        SEND_QUEUE.notify(context.bot, message.chat_id, msg_text, delete_after=5)
         
     except Exception as e:
         logger.error(f"Manual fallback error: {e}")
@@ -260,37 +321,27 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     user = update.effective_user
     message = update.message
-    db.initialize_user(user.id, user.username or "Unknown")
+    db.ensure_user(user.id, user.username or "Unknown")
     
     if await is_admin(update, context): return
 
     message_text = message.text or message.caption or ""
     if not message_text: return 
-    message_text_lower = message_text.lower()
     
-    if has_link(message):
+    link = detect_link_in_entities(message)
+    verdict = ("link", link.rule) if link else check_text(message_text)
+    if not verdict: return
+
+    kind, detail = verdict
+    if kind == "link":
         try:
-            await message.delete()
+            delete_soon(context.bot, message.chat_id, message.message_id)
             await handle_punishment(update, context, user, "ارسال لینک")
-            await log_spam_event(user.id, user.username or "Unknown", "link", message_text[:100], message.chat_id)
-            return
+            await log_spam_event(user.id, user.username or "Unknown", f"link:{detail}", message_text[:100], message.chat_id)
+        except Exception: pass
+    elif kind == "banned_word":
+        try:
+            delete_soon(context.bot, message.chat_id, message.message_id)
+            await handle_punishment(update, context, user, "ارسال کلمات نامناسب")
+            await log_spam_event(user.id, user.username or "Unknown", "banned_word", detail, message.chat.id)
         except Exception: pass
-    
-    banned_words = db.get_banned_words()
-    if banned_words:
-        cleaned_message = normalize_text(message_text_lower)
-        found_banned = False
-        found_word = ""
-        for word in banned_words:
-            if word in message_text_lower:
-                found_banned = True; found_word = word; break
-            word_clean = normalize_text(word)
-            if word_clean and word_clean in cleaned_message:
-                found_banned = True; found_word = word; break
-        
-        if found_banned:
-            try:
-                await message.delete()
-                await handle_punishment(update, context, user, "ارسال کلمات نامناسب")
-                await log_spam_event(user.id, user.username or "Unknown", "banned_word", found_word, message.chat.id)
-            except Exception: pass
\ No newline at end of file
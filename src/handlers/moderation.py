@@ -3,47 +3,18 @@ Moderation handlers for group administration (Persian/Farsi)
 """
 
 import logging
-import asyncio
-from telegram import Update, ChatMember, ChatPermissions
+from telegram import Update, ChatPermissions
 from telegram.ext import ContextTypes
-from src.database import db
+from src.database import async_db
+from src.deletion_scheduler import schedule_delete
+from src.admin_cache import is_admin
+from src.sticker_sets import STICKER_SETS
 
 logger = logging.getLogger(__name__)
 
-async def delete_later(bot, chat_id, message_id, delay):
-    """Wait for 'delay' seconds, then delete the message"""
-    try:
-        await asyncio.sleep(delay)
-        await bot.delete_message(chat_id=chat_id, message_id=message_id)
-    except Exception:
-        pass
-
 # 🔴 2. SET YOUR OWNER ID HERE
 OWNER_ID = 2117254740
 
-async def is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
-    """Check if the user is a group administrator"""
-    if not update.message or not update.effective_user:
-        return False
-    
-    try:
-        # Get user status in the chat
-        user_status = await update.message.chat.get_member(update.effective_user.id)
-        
-        # Check if user is admin or owner (CREATOR is deprecated, use OWNER)
-        # We check for both to be safe
-        admin_statuses = [ChatMember.ADMINISTRATOR, ChatMember.OWNER]
-        
-        # Fallback for older versions that might still use CREATOR
-        if hasattr(ChatMember, 'CREATOR'):
-            admin_statuses.append(ChatMember.CREATOR)
-        
-        return user_status.status in admin_statuses
-    except Exception as e:
-        logger.error(f"خطا در بررسی دسترسی ادمین: {e}")
-        return False
-
-
 async def delete_messages(context: ContextTypes.DEFAULT_TYPE, chat_id: int, message_id: int, admin_message_id: int = None):
     """Delete bot and admin messages after 5 seconds"""
     try:
@@ -76,13 +47,13 @@ async def warn(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message.reply_to_message or not update.message.reply_to_message.from_user:
         # Send error, delete after 3s
         msg = await context.bot.send_message(chat_id=update.message.chat_id, text="⚠️ لطفاً به پیام کاربر پاسخ دهید.")
-        context.job_queue.run_once(lambda ctx: ctx.bot.delete_message(update.message.chat_id, msg.message_id), when=3)
+        schedule_delete(update.message.chat_id, msg.message_id, 3)
         return
     
     target_user = update.message.reply_to_message.from_user
     
     # Add warning to database
-    new_warn_count = db.add_warn(target_user.id)
+    new_warn_count = await async_db.add_warn(target_user.id)
     
     if new_warn_count is None:
         return
@@ -110,7 +81,7 @@ async def warn(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     
     # Delete after 10 seconds
-    asyncio.create_task(delete_later(context.bot, update.message.chat_id, response.message_id, 10))
+    schedule_delete(update.message.chat_id, response.message_id, 10)
 
 
 async def ban(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -129,7 +100,7 @@ async def ban(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if not update.message.reply_to_message:
         msg = await context.bot.send_message(chat_id=update.message.chat_id, text="⚠️ لطفاً به پیام کاربر پاسخ دهید.")
-        context.job_queue.run_once(lambda ctx: ctx.bot.delete_message(update.message.chat_id, msg.message_id), when=3)
+        schedule_delete(update.message.chat_id, msg.message_id, 3)
         return
     
     target_user = update.message.reply_to_message.from_user
@@ -137,14 +108,14 @@ async def ban(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         await context.bot.ban_chat_member(chat_id=update.message.chat_id, user_id=target_user.id)
         ban_msg = f"🚫 کاربر {target_user.mention_html()} از گروه اخراج شد."
-    except Exception as e:
+    except Exception:
         ban_msg = "❌ خطا در بن کردن کاربر."
     
     # 2. Send Confirmation
     response = await context.bot.send_message(chat_id=update.message.chat_id, text=ban_msg, parse_mode="HTML")
     
     # Delete after 5 seconds
-    asyncio.create_task(delete_later(context.bot, update.message.chat_id, response.message_id, 5))
+    schedule_delete(update.message.chat_id, response.message_id, 5)
 
 async def unmute(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /unmute command - Via Reply, ID, or @Username"""
@@ -175,7 +146,7 @@ async def unmute(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Check if it looks like a username (Starts with @ or contains letters)
         if arg.startswith("@") or not arg.isdigit():
             # Look up in Database
-            found_id = db.get_user_id_by_username(arg)
+            found_id = await async_db.get_user_id_by_username(arg)
             if found_id:
                 target_user_id = found_id
                 target_name = f"{arg}"
@@ -184,7 +155,7 @@ async def unmute(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     chat_id=update.message.chat_id,
                     text=f"❌ کاربر {arg} در حافظه ربات پیدا نشد.\n(فقط کاربرانی که قبلاً پیام داده‌اند در حافظه هستند)"
                 )
-                asyncio.create_task(delete_later(context.bot, update.message.chat_id, msg.message_id, 5))
+                schedule_delete(update.message.chat_id, msg.message_id, 5)
                 return
         else:
             # Assume it's a numeric ID
@@ -201,7 +172,7 @@ async def unmute(update: Update, context: ContextTypes.DEFAULT_TYPE):
             text="⚠️ لطفاً روی پیام کاربر ریپلای کنید یا نام کاربری/آیدی او را وارد کنید.\nمثال: /unmute @username",
             parse_mode="HTML"
         )
-        asyncio.create_task(delete_later(context.bot, update.message.chat_id, msg.message_id, 5))
+        schedule_delete(update.message.chat_id, msg.message_id, 5)
         return
     
     # Perform Unban
@@ -210,7 +181,7 @@ async def unmute(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await context.bot.unban_chat_member(chat_id=update.message.chat_id, user_id=target_user_id)
         
         # B. Reset warnings
-        db.reset_warns(target_user_id)
+        await async_db.reset_warns(target_user_id)
         
         # C. Lift Restrictions
         try:
@@ -231,7 +202,7 @@ async def unmute(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Send Confirmation
     response = await context.bot.send_message(chat_id=update.message.chat_id, text=msg_text, parse_mode="HTML")
-    asyncio.create_task(delete_later(context.bot, update.message.chat_id, response.message_id, 5))
+    schedule_delete(update.message.chat_id, response.message_id, 5)
 
 
 async def addword(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -256,12 +227,13 @@ async def addword(update: Update, context: ContextTypes.DEFAULT_TYPE):
             text="⚠️ لطفاً کلمه را وارد کنید. (مثال: /addword تبلیغ)"
         )
         # Delete after 2 seconds
-        asyncio.create_task(delete_later(context.bot, update.message.chat_id, response.message_id, 2))
+        schedule_delete(update.message.chat_id, msg.message_id, 2)
+        return
     
     word = " ".join(context.args).strip()
     
     # Add to DB
-    result = db.add_banned_word(word)
+    result = await async_db.add_banned_word(word)
     
     if result is None:
         text = f"⚠️ کلمه '{word}' قبلاً وجود داشت."
@@ -276,4 +248,60 @@ async def addword(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     
     # Flash Delete (2 seconds)
-    asyncio.create_task(delete_later(context.bot, update.message.chat_id, response.message_id, 2))
\ No newline at end of file
+    schedule_delete(update.message.chat_id, response.message_id, 2)
+
+
+async def _set_pack_verdict(update: Update, context: ContextTypes.DEFAULT_TYPE, action: str):
+    """Shared body of /allowpack and /blockpack (reply to a sticker or pass the pack name)"""
+    if not update.message or not update.effective_user:
+        return
+    
+    # Check admin permissions
+    if not await is_admin(update, context):
+        return
+    
+    # 1. Delete the command message IMMEDIATELY
+    try:
+        await update.message.delete()
+    except Exception:
+        pass
+    
+    reply = update.message.reply_to_message
+    if reply and reply.sticker and reply.sticker.set_name:
+        set_name = reply.sticker.set_name
+    elif context.args:
+        set_name = context.args[0].strip()
+    else:
+        command = "allowpack" if action == "ALLOW" else "blockpack"
+        response = await context.bot.send_message(
+            chat_id=update.message.chat_id,
+            text=f"⚠️ روی یک استیکر ریپلای کنید یا نام پک را وارد کنید. (مثال: /{command} PackName)"
+        )
+        schedule_delete(update.message.chat_id, response.message_id, 2)
+        return
+    
+    if await STICKER_SETS.set_action(set_name, action):
+        verb = "مجاز" if action == "ALLOW" else "ممنوع"
+        text = f"✅ پک استیکر '{set_name}' {verb} شد."
+        logger.info(f"پک '{set_name}' توسط {update.effective_user.id} به {action} تغییر کرد")
+    else:
+        text = f"⚠️ خطا در ذخیره وضعیت پک '{set_name}'."
+    
+    # 2. Send Confirmation
+    response = await context.bot.send_message(
+        chat_id=update.message.chat_id,
+        text=text
+    )
+    
+    # Flash Delete (2 seconds)
+    schedule_delete(update.message.chat_id, response.message_id, 2)
+
+
+async def allowpack(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /allowpack command - Allow a whole sticker pack (no more scans)"""
+    await _set_pack_verdict(update, context, "ALLOW")
+
+
+async def blockpack(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /blockpack command - Block every sticker of a pack"""
+    await _set_pack_verdict(update, context, "BLOCK")
@@ -0,0 +1,148 @@
+"""
+Bot API HTTP client
+Connection pool, keep-alive, HTTP version and timeouts from the environment,
+with pool wait times measured and logged
+"""
+
+import os
+import time
+import asyncio
+import logging
+import httpx
+from telegram.error import TimedOut
+from telegram.request import BaseRequest, HTTPXRequest
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PooledRequest(HTTPXRequest):
+    """
+    HTTPXRequest whose pool slots are handed out by a semaphore of the same
+    size, so the time a call spends waiting for a connection is measured
+    (and bounded by pool_timeout as before). Waits above `log_threshold`
+    seconds are logged, at most once per `log_interval` seconds.
+    """
+
+    def __init__(self, name: str, connection_pool_size: int, keepalive_connections: int, keepalive_expiry: float,
+                 pool_timeout: float, log_threshold: float = 0.5, log_interval: float = 10.0, **kwargs):
+        limits = httpx.Limits(
+            max_connections=connection_pool_size,
+            max_keepalive_connections=keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        super().__init__(
+            connection_pool_size=connection_pool_size,
+            pool_timeout=pool_timeout,
+            httpx_kwargs={"limits": limits},
+            **kwargs
+        )
+        self.name = name
+        self.pool_size = connection_pool_size
+        self.default_pool_timeout = pool_timeout
+        self.log_threshold = log_threshold
+        self.log_interval = log_interval
+        self._slots = asyncio.Semaphore(connection_pool_size)
+        self._last_log = 0.0
+        self._slow_since_log = 0
+
+        self.requests = 0
+        self.in_flight = 0
+        self.slow_waits = 0
+        self.pool_timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def do_request(self, url: str, method: str, request_data=None,
+                         read_timeout=BaseRequest.DEFAULT_NONE, write_timeout=BaseRequest.DEFAULT_NONE,
+                         connect_timeout=BaseRequest.DEFAULT_NONE, pool_timeout=BaseRequest.DEFAULT_NONE):
+        timeout = self.default_pool_timeout if pool_timeout is BaseRequest.DEFAULT_NONE else pool_timeout
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.pool_timeouts += 1
+            logger.warning(f"{self.name}: no free connection after {timeout}s ({self.in_flight} requests in flight)")
+            raise TimedOut(message=f"Pool timeout: all {self.pool_size} connections of {self.name} are busy")
+        self._record_wait(time.monotonic() - started)
+
+        self.in_flight += 1
+        try:
+            return await super().do_request(
+                url, method, request_data=request_data, read_timeout=read_timeout,
+                write_timeout=write_timeout, connect_timeout=connect_timeout, pool_timeout=pool_timeout
+            )
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def _record_wait(self, wait: float):
+        self.requests += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        if wait < self.log_threshold:
+            return
+        self.slow_waits += 1
+        self._slow_since_log += 1
+        now = time.monotonic()
+        if now - self._last_log >= self.log_interval:
+            logger.warning(
+                f"⏳ {self.name}: waited {wait:.2f}s for a connection "
+                f"({self._slow_since_log} slow waits since last report, pool size {self.pool_size})"
+            )
+            self._last_log = now
+            self._slow_since_log = 0
+
+    def stats(self) -> dict:
+        return {
+            "pool_size": self.pool_size,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "avg_wait_ms": round(1000 * self.total_wait / self.requests, 1) if self.requests else 0.0,
+            "max_wait_ms": round(1000 * self.max_wait, 1),
+            "slow_waits": self.slow_waits,
+            "pool_timeouts": self.pool_timeouts,
+        }
+
+
+def build_requests():
+    """
+    Request objects for the Application: one shared by all API calls and a
+    separate one for get_updates, so long polling never holds a slot that
+    deletes, bans and sends are waiting for.
+
+    Returns:
+        (request, get_updates_request)
+    """
+    pool_size = int(os.getenv("TG_POOL_SIZE", "64"))
+    keepalive = int(os.getenv("TG_KEEPALIVE_CONNECTIONS", str(pool_size)))
+    common = dict(
+        keepalive_expiry=float(os.getenv("TG_KEEPALIVE_EXPIRY", "30")),
+        connect_timeout=float(os.getenv("TG_CONNECT_TIMEOUT", "60")),
+        read_timeout=float(os.getenv("TG_READ_TIMEOUT", "60")),
+        write_timeout=float(os.getenv("TG_WRITE_TIMEOUT", "30")),
+        http_version=os.getenv("TG_HTTP_VERSION", "1.1"),
+        log_threshold=float(os.getenv("TG_POOL_WAIT_LOG_THRESHOLD", "0.5")),
+    )
+    request = PooledRequest(
+        "bot_api",
+        connection_pool_size=pool_size,
+        keepalive_connections=keepalive,
+        pool_timeout=float(os.getenv("TG_POOL_TIMEOUT", "5")),
+        **common
+    )
+    # get_updates is one long request at a time
+    get_updates_request = PooledRequest(
+        "get_updates",
+        connection_pool_size=1,
+        keepalive_connections=1,
+        pool_timeout=float(os.getenv("TG_POOL_TIMEOUT", "5")),
+        **common
+    )
+    metrics.register("bot_api_pool", request.stats)
+    metrics.register("get_updates_pool", get_updates_request.stats)
+    logger.info(
+        f"Bot API client: pool {pool_size}, HTTP/{common['http_version']}, "
+        f"{keepalive} keep-alive connections ({common['keepalive_expiry']}s)"
+    )
+    return request, get_updates_request
@@ -0,0 +1,246 @@
+"""
+Compiled link detection engine
+Built once at import time; reports which rule fired for every detection
+"""
+
+import logging
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+from telegram import MessageEntity
+
+logger = logging.getLogger(__name__)
+
+SUFFIX_LIST_PATH = os.path.join(os.path.dirname(__file__), "data", "public_suffixes.txt")
+
+
+class LinkHit(NamedTuple):
+    """Which rule detected a link, and the text fragment it fired on"""
+    rule: str
+    fragment: str
+
+
+# ==================== Public Suffix Trie ====================
+
+class SuffixTrie:
+    """Trie of domain labels, walked right to left (com -> google -> www)"""
+
+    _END = ""
+
+    def __init__(self):
+        self._root: Dict[str, dict] = {}
+        self.size = 0
+
+    def add(self, suffix: str):
+        node = self._root
+        for label in reversed(suffix.split(".")):
+            node = node.setdefault(label, {})
+        if self._END not in node:
+            node[self._END] = {}
+            self.size += 1
+
+    def match(self, labels: List[str]) -> int:
+        """Number of trailing labels that form the longest known suffix (0 = none)"""
+        node = self._root
+        best = 0
+        for depth, label in enumerate(reversed(labels), start=1):
+            node = node.get(label)
+            if node is None:
+                break
+            if self._END in node:
+                best = depth
+        return best
+
+    @classmethod
+    def from_file(cls, path: str) -> "SuffixTrie":
+        trie = cls()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip().lower()
+                # Comments, blank lines, wildcard and exception rules
+                if not line or line.startswith("//") or line[0] in "*!":
+                    continue
+                trie.add(line)
+        return trie
+
+
+try:
+    SUFFIXES = SuffixTrie.from_file(SUFFIX_LIST_PATH)
+except OSError as e:
+    logger.error(f"Could not load public suffix list ({e}), using built-in fallback")
+    SUFFIXES = SuffixTrie()
+    for _tld in ("com", "ir", "net", "org", "xyz", "tk", "info", "io", "me", "site"):
+        SUFFIXES.add(_tld)
+
+
+# ==================== Obfuscation Folding ====================
+
+# Homoglyphs that spammers swap into Latin domains (Cyrillic, Greek, IPA)
+_HOMOGLYPHS = {
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h",
+    "о": "o", "р": "p", "с": "c", "т": "t", "у": "y", "х": "x", "і": "i",
+    "ї": "i", "ј": "j", "ѕ": "s", "ԁ": "d", "ԛ": "q", "ԝ": "w", "һ": "h",
+    "α": "a", "β": "b", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v",
+    "ο": "o", "ρ": "p", "τ": "t", "υ": "u", "χ": "x", "ω": "w",
+    "ɡ": "g", "ɑ": "a", "ı": "i", "ℓ": "l",
+}
+
+# Characters used as a stand-in for "."
+_DOT_LIKES = "\u3002\uff61\uff0e\u2024\u2027\u2219\u2022\u00b7\u066b\u06d4"
+
+_FOLD_TABLE = {ord(k): v for k, v in _HOMOGLYPHS.items()}
+_FOLD_TABLE.update({ord(k.upper()): v for k, v in _HOMOGLYPHS.items() if len(k.upper()) == 1})
+_FOLD_TABLE.update({ord(c): "." for c in _DOT_LIKES})
+# Fullwidth ASCII (！ to ～)
+_FOLD_TABLE.update({code: chr(code - 0xFEE0) for code in range(0xFF01, 0xFF5F)})
+# Persian and Arabic-Indic digits
+_FOLD_TABLE.update({0x06F0 + i: str(i) for i in range(10)})
+_FOLD_TABLE.update({0x0660 + i: str(i) for i in range(10)})
+# Zero-width characters hide dots and letters from naive matching
+_FOLD_TABLE.update({ord(c): None for c in "\u200b\u200c\u200d\u2060\ufeff\u00ad"})
+
+
+class _SkeletonTable(dict):
+    """Translate table keeping only a-z; every other code point is deleted (memoized)"""
+
+    def __missing__(self, code: int) -> None:
+        self[code] = None
+        return None
+
+
+_SKELETON_TABLE = _SkeletonTable({code: chr(code) for code in range(ord("a"), ord("z") + 1)})
+
+
+def fold_text(text: str) -> str:
+    """Fold homoglyphs, fullwidth forms, Persian digits and dot look-alikes, then lowercase"""
+    return text.translate(_FOLD_TABLE).lower()
+
+
+# ==================== Compiled Rules ====================
+
+# "google dot com", "t (dot) me" (Latin labels around a spelled-out dot)
+_DOT_WORD_RE = re.compile(r"(?:\s+|\s*[(\[{]\s*)(?:dot|نقطه|دات)(?:\s+|\s*[)\]}]\s*)")
+
+# "سایت نقطه کام", "گوگل.آی آر": the extension itself spelled in Persian
+# (matched after _DOT_WORD_RE has turned the spelled-out dot into ".")
+_PERSIAN_TLD_RE = re.compile(r"\w\.\s*(?:کام|نت|اورگ|آی\s*آر|ای\s*ار)(?!\w)")
+
+_URL_RE = re.compile(
+    r"(?P<scheme>\b(?:https?|ftp)://|\bwww\.)"
+    r"|(?P<telegram>\b(?:t|telegram)\.(?:me|dog)\b|\btg://)"
+    r"|(?P<domain>(?<![\w.@-])(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,24}\b)"
+)
+
+# Extensions and sites targeted by the letters-only skeleton rules
+_SKELETON_TLDS = ("com", "ir", "net", "org", "xyz", "tk", "info", "io", "me", "site")
+_SKELETON_SITES = ("google", "youtube", "instagram", "telegram", "whatsapp", "sex", "porn", "xxx")
+_REPEAT_RE = re.compile(r"(.)(?=\1)")
+
+
+def _collapse(text: str) -> str:
+    return _REPEAT_RE.sub("", text)
+
+
+def _alternation(words) -> str:
+    # Longest first so the regex engine prefers the most specific alternative
+    return "|".join(sorted({re.escape(w) for w in words}, key=len, reverse=True))
+
+
+# Sites are matched against the collapsed skeleton, so they are collapsed too
+# ("google" -> "gogle"); "xxx" would collapse to a single letter and is
+# matched on the raw skeleton instead
+_SKELETON_SITE_RE = re.compile(
+    f"(?:{_alternation(_collapse(s) for s in _SKELETON_SITES if len(_collapse(s)) > 2)})"
+    f"(?:{_alternation(_SKELETON_TLDS)})"
+)
+_SKELETON_RAW_RE = re.compile(
+    f"(?P<site>(?:{_alternation(s for s in _SKELETON_SITES if len(_collapse(s)) <= 2)})"
+    f"(?:{_alternation(_SKELETON_TLDS)}))"
+    r"|(?P<prefix>https?|www)"
+)
+_SKELETON_PREFIX_RE = re.compile(r"tme")
+# Without a scheme or "www", a dotted word only counts as a domain under these
+# extensions (plus "ly" for bit.ly): ccTLDs like .so/.it/.is also end ordinary
+# sentences typed without a space ("I was tired.so I left")
+_BARE_DOMAIN_TLDS = frozenset(_SKELETON_TLDS + ("ly",))
+_SKELETON_TAIL_RE = re.compile(f"(?:{_alternation(_SKELETON_TLDS)})$")
+_SYMBOL_RE = re.compile(r"[./,\\_]")
+
+
+# ==================== Detection ====================
+
+def detect_link_in_text(text: str) -> Optional[LinkHit]:
+    """
+    Run every text rule over a message.
+
+    Returns:
+        LinkHit naming the rule that fired, or None
+    """
+    if not text:
+        return None
+
+    folded = _DOT_WORD_RE.sub(".", fold_text(text))
+
+    # 1. URL-shaped tokens, checked against the public suffix trie
+    for m in _URL_RE.finditer(folded):
+        kind = m.lastgroup
+        if kind != "domain":
+            return LinkHit(kind, m.group())
+        labels = m.group().split(".")
+        if labels[-1] not in _BARE_DOMAIN_TLDS:
+            continue
+        suffix_len = SUFFIXES.match(labels)
+        if suffix_len and len(labels) > suffix_len:
+            return LinkHit(f"domain:{'.'.join(labels[-suffix_len:])}", m.group())
+
+    m = _PERSIAN_TLD_RE.search(folded)
+    if m:
+        return LinkHit("persian_tld", m.group())
+
+    # 2. Letters-only skeleton ("w w w . g o o g l e . c o m")
+    skeleton = folded.translate(_SKELETON_TABLE)
+    if not skeleton:
+        return None
+
+    m = _SKELETON_RAW_RE.search(skeleton)
+    if m:
+        return LinkHit(f"skeleton_{m.lastgroup}", m.group())
+
+    skeleton_clean = _collapse(skeleton)
+    m = _SKELETON_SITE_RE.search(skeleton_clean)
+    if m:
+        return LinkHit("skeleton_site", m.group())
+
+    m = _SKELETON_PREFIX_RE.search(skeleton_clean)
+    if m:
+        return LinkHit("skeleton_prefix", m.group())
+
+    if _SYMBOL_RE.search(folded):
+        m = _SKELETON_TAIL_RE.search(skeleton_clean)
+        if m and len(skeleton_clean) > len(m.group()) + 2:
+            return LinkHit("skeleton_tail", skeleton_clean)
+
+    return None
+
+
+def detect_link_in_entities(message) -> Optional[LinkHit]:
+    """Check the URL / text-link entities Telegram already parsed"""
+    entities = list(message.entities or []) + list(message.caption_entities or [])
+    for entity in entities:
+        if entity.type in (MessageEntity.URL, MessageEntity.TEXT_LINK):
+            return LinkHit(f"entity:{entity.type}", entity.url or "")
+    return None
+
+
+def detect_link(message) -> Optional[LinkHit]:
+    """
+    Detect a link in a Telegram message (entities first, then text rules).
+
+    Returns:
+        LinkHit naming the rule that fired, or None
+    """
+    return detect_link_in_entities(message) or detect_link_in_text(message.text or message.caption or "")
+
+
+logger.info(f"Link detector compiled ({SUFFIXES.size} public suffixes)")
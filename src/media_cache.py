@@ -0,0 +1,212 @@
+"""
+Media verdict store keyed by Telegram's file_unique_id
+In-memory LRU in front of the persistent media_verdicts table, plus a
+perceptual-hash index of blocked images for near-duplicates
+"""
+
+import os
+import asyncio
+import logging
+from typing import Optional
+from src.database import async_db
+from src.verdict_cache import VerdictCache, MISS
+from src.phash import BKTree, Image, phash, to_signed64, from_signed64
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+# Near-duplicate matching needs Pillow to decode thumbnails
+PHASH_ENABLED = Image is not None
+
+
+class MediaVerdictStore:
+    """
+    ALLOW/BLOCK verdicts for media files the bot has already judged.
+
+    Lookups hit the LRU first and the database second; database hits are
+    promoted into the LRU, so repeat stickers/GIFs cost no download and no
+    AI call.
+    """
+
+    def __init__(self, max_size: int = 20000, ttl: float = 86400.0, max_distance: int = 2):
+        self._lru = VerdictCache(max_size=max_size, ttl=ttl)
+        self.db_hits = 0
+        self.db_misses = 0
+        self.saved = 0
+
+        # 🟢 NEW: pHash -> reason of every blocked image, loaded lazily on first use
+        self.max_distance = max_distance
+        self._blocked = BKTree()
+        self._blocked_loaded = False
+        self._load_lock = asyncio.Lock()
+        self.phash_hits = 0
+        self.phash_misses = 0
+
+    async def get(self, file_unique_id: Optional[str]) -> Optional[dict]:
+        """Stored verdict ({"action", "reason"}) or None"""
+        if not file_unique_id:
+            return None
+
+        verdict = self._lru.get(file_unique_id)
+        if verdict is not MISS:
+            return verdict
+
+        verdict = await async_db.get_media_verdict(file_unique_id)
+        if verdict:
+            self.db_hits += 1
+            self._lru.put(file_unique_id, verdict)
+        else:
+            self.db_misses += 1
+        return verdict
+
+    async def put(self, file_unique_id: Optional[str], action: str, reason: str = "", phash: Optional[int] = None):
+        """Remember a final verdict (AI or manual) for a file; blocked hashes join the near-duplicate index"""
+        if not file_unique_id or action not in ("ALLOW", "BLOCK"):
+            return
+
+        verdict = {"action": action, "reason": reason}
+        self._lru.put(file_unique_id, verdict)
+        if action == "BLOCK" and phash is not None:
+            self._blocked.add(phash, reason)
+
+        stored_phash = to_signed64(phash) if phash is not None else None
+        if await async_db.save_media_verdict(file_unique_id, action, reason, stored_phash):
+            self.saved += 1
+
+    async def has_blocked_hashes(self) -> bool:
+        """Whether there is anything to compare against (no thumbnail download otherwise)"""
+        if not PHASH_ENABLED:
+            return False
+        await self._load_blocked()
+        return self._blocked.size > 0
+
+    async def find_similar(self, phash: Optional[int]) -> Optional[dict]:
+        """
+        Nearest blocked image within max_distance ({"reason", "distance"}) or None.
+
+        max_distance is kept to a few bits of the 64-bit pHash, so a match is
+        the same picture re-encoded or resized and is blocked without a scan.
+        """
+        if phash is None:
+            return None
+
+        await self._load_blocked()
+        match = self._blocked.nearest(phash, self.max_distance)
+        if match is None:
+            self.phash_misses += 1
+            return None
+
+        self.phash_hits += 1
+        distance, _, reason = match
+        return {"reason": reason or "", "distance": distance}
+
+    async def _load_blocked(self):
+        if self._blocked_loaded:
+            return
+        async with self._load_lock:
+            if self._blocked_loaded:
+                return
+            rows = await async_db.get_blocked_phashes()
+            for row in rows:
+                self._blocked.add(from_signed64(row["phash"]), row.get("reason"))
+            self._blocked_loaded = True
+            logger.info(f"Loaded {len(rows)} blocked media hashes")
+
+    def stats(self) -> dict:
+        lru = self._lru.stats()
+        return {
+            "lru_size": lru["size"],
+            "lru_hits": lru["hits"],
+            "lru_evictions": lru["evictions"],
+            "db_hits": self.db_hits,
+            "db_misses": self.db_misses,
+            "saved": self.saved,
+            "blocked_hashes": self._blocked.size,
+            "phash_hits": self.phash_hits,
+            "phash_misses": self.phash_misses,
+        }
+
+
+def thumbnail_of(message):
+    """
+    The small preview Telegram generates for a media message, so every media
+    type is hashed from the same kind of image (PhotoSize or None).
+    """
+    if message.photo:
+        return message.photo[0]  # Smallest size
+    media = message.sticker or message.animation or message.video
+    return getattr(media, "thumbnail", None) if media else None
+
+
+async def fetch_thumbnail(bot, message) -> Optional[bytes]:
+    """Download the message's thumbnail (a few KB), or None if there is none"""
+    thumbnail = thumbnail_of(message)
+    if thumbnail is None:
+        return None
+    try:
+        thumb_file = await bot.get_file(thumbnail.file_id)
+        return bytes(await thumb_file.download_as_bytearray())
+    except Exception as e:
+        logger.warning(f"Could not download media thumbnail: {e}")
+        return None
+
+
+class Thumbnail:
+    """
+    A message's thumbnail, downloaded and hashed at most once however many
+    steps of a media check need it.
+    """
+
+    def __init__(self, bot, message):
+        self._bot = bot
+        self._message = message
+        self._data: Optional[bytes] = None
+        self._phash: Optional[int] = None
+        self._fetched = False
+        self._hashed = False
+
+    async def data(self) -> Optional[bytes]:
+        if not self._fetched:
+            self._fetched = True
+            self._data = await fetch_thumbnail(self._bot, self._message)
+        return self._data
+
+    async def fingerprint(self) -> Optional[int]:
+        """pHash of the thumbnail (not downloaded at all when Pillow is missing)"""
+        if not PHASH_ENABLED:
+            return None
+        if not self._hashed:
+            self._hashed = True
+            self._phash = await media_fingerprint(await self.data())
+        return self._phash
+
+
+def image_mime(data: bytes) -> str:
+    """Mime type of a Telegram thumbnail (JPEG, or WebP for some stickers)"""
+    return "image/webp" if data[:4] == b"RIFF" and data[8:12] == b"WEBP" else "image/jpeg"
+
+
+async def media_fingerprint(media) -> Optional[int]:
+    """
+    pHash of image bytes or of a downloaded file object (rewound afterwards,
+    so it can still be scanned), or None if there is none / Pillow is missing
+    """
+    if not PHASH_ENABLED or media is None:
+        return None
+    return await asyncio.to_thread(_fingerprint, media)
+
+
+def _fingerprint(media) -> Optional[int]:
+    if isinstance(media, (bytes, bytearray)):
+        return phash(media)
+    data = media.read()
+    media.seek(0)
+    return phash(data)
+
+
+MEDIA_VERDICTS = MediaVerdictStore(
+    max_size=int(os.getenv("MEDIA_VERDICT_CACHE_SIZE", "20000")),
+    ttl=float(os.getenv("MEDIA_VERDICT_CACHE_TTL", "86400")),
+    max_distance=int(os.getenv("PHASH_MAX_DISTANCE", "2")),
+)
+metrics.register("media_verdicts", MEDIA_VERDICTS.stats)
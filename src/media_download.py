@@ -0,0 +1,133 @@
+"""
+Streaming media downloads under a global in-flight byte budget
+Files are spooled (memory up to a small limit, then a temp file) instead of
+being held in memory while they wait for the AI scanner
+"""
+
+import os
+import asyncio
+import logging
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Optional
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ByteBudget:
+    """
+    Caps the bytes of media being downloaded/scanned at once.
+
+    acquire() waits until the request fits, so a burst of large videos
+    queues up instead of exhausting memory. A request larger than the whole
+    budget is clipped to it (it then runs alone). release() is synchronous,
+    so it can run from a future's done callback.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.in_use = 0
+        self.peak = 0
+        self.waiting = 0
+        self.timeouts = 0
+        self._freed = asyncio.Event()
+
+    async def acquire(self, size: int, timeout: Optional[float] = None) -> int:
+        """
+        Take `size` bytes of the budget; raises asyncio.TimeoutError if they don't free up in time.
+
+        Returns:
+            The (clipped) size to pass to release()
+        """
+        size = min(max(size, 0), self.max_bytes)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._wait_for_room(size), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.waiting -= 1
+        return size
+
+    async def _wait_for_room(self, size: int):
+        while self.in_use + size > self.max_bytes:
+            self._freed.clear()
+            await self._freed.wait()
+        # No await between the check and the update: nobody can take the room meanwhile
+        self.in_use += size
+        self.peak = max(self.peak, self.in_use)
+
+    def release(self, size: int):
+        self.in_use -= size
+        self._freed.set()
+
+    def stats(self) -> dict:
+        return {
+            "in_use_mb": round(self.in_use / 1048576, 1),
+            "peak_mb": round(self.peak / 1048576, 1),
+            "max_mb": round(self.max_bytes / 1048576, 1),
+            "waiting": self.waiting,
+            "timeouts": self.timeouts,
+        }
+
+
+MEDIA_BYTES = ByteBudget(int(os.getenv("MEDIA_BYTE_BUDGET_MB", "64")) * 1048576)
+metrics.register("media_bytes", MEDIA_BYTES.stats)
+
+# Downloads up to this size stay in memory; larger ones roll over to a temp file
+SPOOL_MEMORY_MAX = int(os.getenv("MEDIA_SPOOL_MEMORY_KB", "1024")) * 1024
+BUDGET_WAIT = float(os.getenv("MEDIA_BUDGET_WAIT", "30"))
+DEFAULT_FILE_SIZE = 20 * 1024 * 1024  # Telegram didn't report a size: assume the bot API maximum
+
+
+class SpooledMedia:
+    """
+    A downloaded file and its share of MEDIA_BYTES.
+
+    Readable like the spool it wraps. Every holder (the download block, and
+    each worker thread still reading it, see hold()) calls release() once;
+    the spool is closed and the bytes returned to the budget by the last
+    one, so a scan that outlives its deadline keeps its bytes reserved.
+    """
+
+    def __init__(self, spool, size: int):
+        self._spool = spool
+        self._size = size
+        self._holders = 1
+
+    def read(self, *args):
+        return self._spool.read(*args)
+
+    def seek(self, *args):
+        return self._spool.seek(*args)
+
+    def hold(self):
+        self._holders += 1
+
+    def release(self):
+        self._holders -= 1
+        if self._holders == 0:
+            self._spool.close()
+            MEDIA_BYTES.release(self._size)
+
+
+@asynccontextmanager
+async def spooled_download(bot, file_id: str, file_size: Optional[int] = None):
+    """
+    Stream a Telegram file into a SpooledTemporaryFile and yield it as a
+    SpooledMedia (positioned at 0).
+
+    The file's size is held against MEDIA_BYTES, and the spool stays open,
+    until the block exits and every hold() on it has been released.
+    """
+    size = await MEDIA_BYTES.acquire(file_size or DEFAULT_FILE_SIZE, timeout=BUDGET_WAIT)
+    media = SpooledMedia(tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_MAX, prefix="media-"), size)
+    try:
+        tg_file = await bot.get_file(file_id)
+        await tg_file.download_to_memory(out=media._spool)
+        media.seek(0)
+        yield media
+    finally:
+        media.release()
@@ -0,0 +1,268 @@
+"""
+Media scanning service
+Long-lived front for the Gemini scanner: dedicated worker pool, API rate
+limit, per-request deadlines, circuit breaker, retry budget and queue metrics
+"""
+
+import os
+import time
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from src.database import db
+from src import ai_safety
+from src.ai_safety import scan_media, build_prompt, EXTRACT_PROMPT, PROMPT_MODE
+from src.link_detector import detect_link_in_text
+from src.rate_limit import TokenBucket
+from src.media_download import SpooledMedia
+from src.circuit_breaker import CircuitBreaker, RetryBudget
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MediaScanner:
+    """
+    Runs scan_media on its own bounded thread pool.
+
+    Each request waits for a worker slot and an API token, then for the
+    model, all within one deadline; requests that can't finish in time (or
+    that arrive while the queue is full) return None, which the handler
+    treats as "send to manual approval".
+
+    A circuit breaker short-circuits to that fallback while Gemini is
+    failing or slow, and failed calls are retried only within a retry budget.
+    """
+
+    def __init__(self, max_workers: int = 4, rate_per_minute: float = 15.0, burst: int = 5,
+                 deadline: float = 45.0, max_queue: int = 50, max_attempts: int = 2,
+                 breaker: Optional[CircuitBreaker] = None, retry_budget: Optional[RetryBudget] = None,
+                 prompt_mode: str = "inline"):
+        self.prompt_mode = prompt_mode
+        self.deadline = deadline
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.breaker = breaker or CircuitBreaker("gemini")
+        self.retry_budget = retry_budget or RetryBudget()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai")
+        self._slots = asyncio.Semaphore(max_workers)
+        self._bucket = TokenBucket(rate=rate_per_minute / 60.0, capacity=burst)
+
+        # Prompt is re-rendered only when the banned word list changes
+        self._prompt = None
+        self._prompt_version = None
+
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.short_circuited = 0
+        self.retries = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _current_prompt(self) -> str:
+        if self.prompt_mode == "extract":
+            return EXTRACT_PROMPT
+        version = db.banned_words_version
+        if self._prompt is None or self._prompt_version != version:
+            self._prompt = build_prompt(db.get_banned_words())
+            self._prompt_version = version
+        return self._prompt
+
+    def accepting(self) -> bool:
+        """False while scans would be refused anyway (no API key, circuit open)"""
+        return bool(ai_safety.api_key) and not self.breaker.is_open()
+
+    async def scan(self, content_bytes, mime_type: str) -> Optional[dict]:
+        """
+        AI verdict ({"action", "reason", ...}) or None on error/timeout/overload/open circuit.
+        
+        `content_bytes` is bytes or a readable file object (see spooled_download).
+        """
+        if not ai_safety.api_key:
+            return None
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            logger.warning(f"AI scan queue full ({self.queued}), sending to manual approval")
+            return None
+        if not self.breaker.allow():
+            self.short_circuited += 1
+            return None
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        self.retry_budget.record_request()
+
+        attempt = 1
+        while True:
+            verdict, retryable = await self._attempt(content_bytes, mime_type, deadline)
+            if verdict is not None:
+                return self._judge_extraction(verdict) if self.prompt_mode == "extract" else verdict
+            if not retryable or attempt >= self.max_attempts:
+                return None
+
+            backoff = 0.5 * attempt
+            if deadline - loop.time() <= backoff or not self.retry_budget.try_retry():
+                return None
+            await asyncio.sleep(backoff)
+            # Ask the breaker only after the backoff, so a scan cancelled while
+            # sleeping doesn't hold a half-open trial it never reports
+            if not self.breaker.allow():
+                self.short_circuited += 1
+                return None
+            attempt += 1
+            self.retries += 1
+            logger.info(f"Retrying AI scan (attempt {attempt}/{self.max_attempts})")
+
+    async def _attempt(self, content_bytes, mime_type: str, deadline: float) -> Tuple[Optional[dict], bool]:
+        """
+        One breaker-approved call to the model.
+
+        Returns:
+            (verdict or None, whether a failure is worth retrying)
+        """
+        loop = asyncio.get_running_loop()
+        enqueued_at = time.monotonic()
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            self.queued -= 1
+            self.timeouts += 1
+            self.breaker.cancel()
+            logger.error(f"AI scan waited {self.deadline}s for a worker, giving up")
+            return None, False
+        except asyncio.CancelledError:
+            self.queued -= 1
+            self.breaker.cancel()
+            raise
+
+        # The slot is released when the worker thread finishes, not when we
+        # stop waiting, so timed-out scans can't oversubscribe the pool
+        handed_off = False
+        started = None
+        try:
+            try:
+                acquired = await self._bucket.acquire(timeout=max(0.0, deadline - loop.time()))
+                if not acquired or loop.time() >= deadline:
+                    self.timeouts += 1
+                    self.breaker.cancel()
+                    logger.error("AI scan rate limit would exceed the deadline, giving up")
+                    return None, False
+            finally:
+                self.queued -= 1
+                waited = time.monotonic() - enqueued_at
+                self._waits += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+            future = loop.run_in_executor(
+                self._executor,
+                functools.partial(scan_media, content_bytes, mime_type, prompt=self._current_prompt())
+            )
+            future.add_done_callback(lambda _: self._slots.release())
+            if isinstance(content_bytes, SpooledMedia):
+                # The worker thread reads the file: keep it (and its byte budget) until the thread is done
+                content_bytes.hold()
+                future.add_done_callback(lambda _: content_bytes.release())
+            handed_off = True
+            started = time.monotonic()
+            self.in_flight += 1
+            try:
+                verdict = await asyncio.wait_for(asyncio.shield(future), max(0.0, deadline - loop.time()))
+            finally:
+                self.in_flight -= 1
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.breaker.record(False, time.monotonic() - started)
+            logger.error(f"AI scan exceeded its {self.deadline}s deadline")
+            return None, False
+        except Exception as e:
+            self.failed += 1
+            if started is None:
+                self.breaker.cancel()
+            else:
+                self.breaker.record(False, time.monotonic() - started)
+            logger.error(f"AI scan failed: {e}")
+            return None, started is not None
+        except asyncio.CancelledError:
+            # Cancelled by the caller (e.g. the handler's own timeout). Still
+            # report the call, or a half-open breaker keeps waiting for this
+            # trial and refuses everything else
+            if started is None:
+                self.breaker.cancel()
+            else:
+                self.failed += 1
+                self.breaker.record(False, time.monotonic() - started)
+            raise
+        finally:
+            if not handed_off:
+                self._slots.release()
+
+        duration = time.monotonic() - started
+        self.breaker.record(verdict is not None, duration)
+        if verdict is None:
+            self.failed += 1
+            return None, True
+        self.completed += 1
+        return verdict, False
+
+    @staticmethod
+    def _judge_extraction(result: dict) -> dict:
+        """Turn an extract-mode reply (text + nsfw/link flags) into an ALLOW/BLOCK verdict"""
+        if result.get("nsfw"):
+            return {"action": "BLOCK", "violation": "NSFW", "reason": result.get("reason") or "NSFW"}
+        if result.get("link"):
+            return {"action": "BLOCK", "violation": "LINK", "reason": result.get("reason") or "LINK"}
+
+        text = str(result.get("text") or "")
+        link = detect_link_in_text(text)
+        if link:
+            return {"action": "BLOCK", "violation": "LINK", "reason": f"link:{link.rule}"}
+        match = db.find_banned_word(text)
+        if match:
+            return {"action": "BLOCK", "violation": "WORD", "reason": f"banned_word:{match.word}"}
+        return {"action": "ALLOW", "violation": "NONE", "reason": ""}
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "short_circuited": self.short_circuited,
+            "retries": self.retries,
+            "throttled": self._bucket.throttled,
+            "avg_wait_ms": round(self._wait_total / self._waits * 1000, 1) if self._waits else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 1),
+        }
+
+
+MEDIA_SCANNER = MediaScanner(
+    max_workers=int(os.getenv("AI_MAX_WORKERS", "4")),
+    rate_per_minute=float(os.getenv("AI_RATE_PER_MINUTE", "15")),
+    burst=int(os.getenv("AI_RATE_BURST", "5")),
+    deadline=float(os.getenv("AI_SCAN_DEADLINE", "45")),
+    max_queue=int(os.getenv("AI_MAX_QUEUE", "50")),
+    max_attempts=int(os.getenv("AI_MAX_ATTEMPTS", "2")),
+    breaker=CircuitBreaker(
+        "gemini",
+        window=int(os.getenv("AI_BREAKER_WINDOW", "20")),
+        failure_rate=float(os.getenv("AI_BREAKER_FAILURE_RATE", "0.5")),
+        slow_call_seconds=float(os.getenv("AI_BREAKER_SLOW_CALL", "20")),
+        open_seconds=float(os.getenv("AI_BREAKER_OPEN_SECONDS", "60")),
+    ),
+    retry_budget=RetryBudget(ratio=float(os.getenv("AI_RETRY_RATIO", "0.2"))),
+    prompt_mode=PROMPT_MODE,
+)
+metrics.register("media_scanner", MEDIA_SCANNER.stats)
+metrics.register("gemini_breaker", MEDIA_SCANNER.breaker.stats)
+metrics.register("gemini_retry_budget", MEDIA_SCANNER.retry_budget.stats)
@@ -0,0 +1,33 @@
+"""
+In-process metrics registry
+Components register a callable that returns their current counters
+"""
+
+import logging
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+_sources: Dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, source: Callable[[], dict]):
+    """Register (or replace) a metrics source under a unique name"""
+    _sources[name] = source
+
+
+def snapshot() -> Dict[str, dict]:
+    """Collect the current values of every registered source"""
+    result = {}
+    for name, source in list(_sources.items()):
+        try:
+            result[name] = source()
+        except Exception as e:
+            logger.error(f"Error collecting metrics from {name}: {e}")
+    return result
+
+
+async def log_metrics(context):
+    """Job callback: write a metrics snapshot to the log"""
+    for name, values in snapshot().items():
+        logger.info(f"📈 {name}: {values}")
@@ -0,0 +1,84 @@
+"""
+Persian text normalization engine
+Folds letter variants, digits and invisible marks with precomputed translate tables
+"""
+
+import re
+from typing import Optional
+
+# Arabic code points folded onto their Persian equivalents
+_LETTER_FOLDS = {
+    "ي": "ی",  # Arabic yeh
+    "ى": "ی",  # Alef maksura
+    "ئ": "ی",  # Yeh with hamza
+    "ك": "ک",  # Arabic kaf
+    "ۀ": "ه",  # Heh with yeh
+    "ة": "ه",  # Teh marbuta
+    "ۃ": "ه",  # Teh marbuta goal
+    "أ": "ا",  # Alef with hamza above
+    "إ": "ا",  # Alef with hamza below
+    "ٱ": "ا",  # Alef wasla
+    "ؤ": "و",  # Waw with hamza
+}
+
+# Zero-width joiners, direction marks, tatweel, Arabic punctuation
+_DROPPED = (
+    "\u200b\u200c\u200d\u200e\u200f\u00ad\ufeff"
+    "\u0640"
+    "\u060c\u061b\u061f\u066a\u066b\u066c\u06d4"
+)
+
+# Harakat, superscript alef and Quranic annotation marks
+_DROPPED_RANGES = ((0x064B, 0x065F), (0x0670, 0x0670), (0x06D6, 0x06ED))
+
+# Matches every character that is followed by the same character; deleting
+# the matches collapses runs without a template-expansion step
+_REPEAT_RE = re.compile(r"(.)(?=\1)")
+
+
+def _fold(code: int) -> Optional[str]:
+    """Normalized form of a single code point (None means drop it)"""
+    ch = chr(code)
+    if ch in _LETTER_FOLDS:
+        return _LETTER_FOLDS[ch]
+    if ch in _DROPPED or ch == "_":
+        return None
+    for start, end in _DROPPED_RANGES:
+        if start <= code <= end:
+            return None
+    if ch.isdecimal():
+        # Persian (۰-۹), Arabic-Indic (٠-٩) and other decimal digits -> ASCII
+        return str(int(ch))
+    lowered = ch.lower()
+    if len(lowered) != 1:
+        lowered = ch
+    if lowered.isalnum() or "\u0600" <= lowered <= "\u06ff":
+        return lowered
+    return None
+
+
+class _FoldTable(dict):
+    """str.translate table; code points outside the BMP are folded on first use"""
+
+    def __missing__(self, code: int) -> Optional[str]:
+        value = _fold(code)
+        self[code] = value
+        return value
+
+
+# The whole Basic Multilingual Plane is folded up front (~65k entries) so
+# str.translate never has to call back into Python for ordinary text
+FOLD_TABLE = _FoldTable((code, _fold(code)) for code in range(0x10000))
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text for banned-word matching.
+
+    Folds Arabic/Persian letter variants and digits, drops ZWNJ, diacritics,
+    punctuation and symbols, lowercases and collapses repeated characters.
+    """
+    if not text:
+        return ""
+    return _REPEAT_RE.sub("", text.translate(FOLD_TABLE))
+
@@ -0,0 +1,126 @@
+"""
+Perceptual hashing and near-duplicate lookup for images
+64-bit DCT pHash fingerprints + a BK-tree over Hamming distance
+"""
+
+import io
+import math
+import logging
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+except ImportError:  # Optional dependency: near-duplicate blocking is skipped
+    Image = None
+    logger.warning("⚠️ Pillow is not installed. Perceptual-hash matching will be skipped.")
+
+IMAGE_SIZE = 32  # Images are shrunk to 32x32 grey before the DCT
+HASH_SIZE = 8  # 8x8 lowest frequencies -> 64-bit hash
+
+# DCT-II basis for the low frequencies: _COS[u][x]
+_COS = [[math.cos(math.pi * (2 * x + 1) * u / (2 * IMAGE_SIZE)) for x in range(IMAGE_SIZE)] for u in range(HASH_SIZE)]
+
+
+def phash(image_bytes) -> Optional[int]:
+    """
+    64-bit perceptual hash of an image: one bit per low-frequency DCT
+    coefficient, set when it is above the median (robust to re-encoding,
+    resizing and colour changes). Returns None if Pillow is missing or the
+    image can't be read.
+    """
+    if Image is None or not image_bytes:
+        return None
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            img.seek(0)  # First frame of animated WebP/GIF
+            small = img.convert("L").resize((IMAGE_SIZE, IMAGE_SIZE), Image.LANCZOS)
+            pixels = list(small.getdata())
+    except Exception as e:
+        logger.warning(f"Could not hash image: {e}")
+        return None
+
+    # Separable 2D DCT, computing only the HASH_SIZE x HASH_SIZE corner we keep
+    rows = [
+        [sum(c * p for c, p in zip(_COS[u], pixels[y * IMAGE_SIZE:(y + 1) * IMAGE_SIZE])) for u in range(HASH_SIZE)]
+        for y in range(IMAGE_SIZE)
+    ]
+    coefficients = [
+        sum(_COS[v][y] * rows[y][u] for y in range(IMAGE_SIZE))
+        for v in range(HASH_SIZE) for u in range(HASH_SIZE)
+    ]
+    ordered = sorted(coefficients)
+    median = (ordered[31] + ordered[32]) / 2
+
+    value = 0
+    for coefficient in coefficients:
+        value = (value << 1) | (coefficient > median)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def to_signed64(value: int) -> int:
+    """Unsigned 64-bit hash -> signed (fits a Postgres/SQLite BIGINT)"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def from_signed64(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance.
+
+    Each node's children are keyed by their distance to it, so a radius
+    search only descends into children within [d - r, d + r] and touches a
+    small fraction of the stored hashes.
+    """
+
+    def __init__(self):
+        # node = [hash, payload, {distance: child}]
+        self._root: Optional[list] = None
+        self.size = 0
+
+    def add(self, value: int, payload: Any = None):
+        if self._root is None:
+            self._root = [value, payload, {}]
+            self.size = 1
+            return
+
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1] = payload  # Same hash: keep the latest payload
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, payload, {}]
+                self.size += 1
+                return
+            node = child
+
+    def nearest(self, value: int, max_distance: int) -> Optional[Tuple[int, int, Any]]:
+        """Closest stored (distance, hash, payload) within max_distance, or None"""
+        if self._root is None:
+            return None
+
+        best: Optional[Tuple[int, int, Any]] = None
+        stack: List[list] = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance and (best is None or distance < best[0]):
+                best = (distance, node[0], node[1])
+                if distance == 0:
+                    break
+            radius = best[0] if best else max_distance
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return best
@@ -0,0 +1,73 @@
+"""
+Async token-bucket rate limiter
+"""
+
+import time
+import asyncio
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, with bursts of up to
+    `capacity`. Waiters are served in arrival order.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.throttled = 0  # Acquisitions that had to wait for a token
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available right now"""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def is_full(self) -> bool:
+        """No tokens spent recently (the bucket is indistinguishable from a new one)"""
+        self._refill()
+        return self._tokens >= self.capacity
+
+    def delay(self) -> float:
+        """Seconds until the next token is available (0 if one is available now)"""
+        self._refill()
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    async def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a token.
+
+        Returns:
+            True once a token was taken, False if it would not be available
+            within `timeout` seconds, counting the wait behind earlier callers
+            (no token is consumed then)
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        try:
+            await asyncio.wait_for(self._lock.acquire(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        try:
+            wait = self.delay()
+            if wait > 0:
+                if deadline is not None and loop.time() + wait > deadline:
+                    return False
+                self.throttled += 1
+                await asyncio.sleep(wait)
+                self._refill()
+            self._tokens -= 1
+            return True
+        finally:
+            self._lock.release()
@@ -0,0 +1,167 @@
+"""
+Outbound Telegram calls: rate limits, RetryAfter handling and notice coalescing
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+from telegram.error import RetryAfter
+from src.rate_limit import TokenBucket
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+def _retry_seconds(retry_after) -> float:
+    # int in older python-telegram-bot releases, timedelta in newer ones
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class SendQueue:
+    """
+    Funnel for the bot's outbound calls.
+
+    Every call takes a token from the global bucket (Telegram's ~30 calls/s
+    per bot) and, for messages, from the chat's bucket (~20 messages/min
+    in groups). A RetryAfter pauses that chat for the time Telegram asks
+    and the call is retried, instead of failing.
+
+    Flash notices (warnings, bans) sent to the same chat within `window`
+    seconds are merged into one summary message.
+    """
+
+    def __init__(self, global_rate: float = 30.0, chat_rate_per_minute: float = 20.0, chat_burst: int = 3,
+                 window: float = 1.5, max_attempts: int = 3):
+        self.window = window
+        self.max_attempts = max_attempts
+        self.chat_rate = chat_rate_per_minute / 60.0
+        self.chat_burst = chat_burst
+        self._global = TokenBucket(rate=global_rate, capacity=global_rate)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._paused_until: Dict[int, float] = {}
+
+        # chat_id -> [(text, delete_after)] waiting to be merged
+        self._notices: Dict[int, List[Tuple[str, Optional[float]]]] = {}
+        self._timers: Dict[int, asyncio.Task] = {}
+
+        self.calls = 0
+        self.retry_afters = 0
+        self.dropped = 0
+        self.notices = 0
+        self.notice_messages = 0
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                # Forget idle chats (a full bucket behaves like a new one)
+                self._chats = {cid: b for cid, b in self._chats.items() if not b.is_full()}
+                now = time.monotonic()
+                self._paused_until = {cid: t for cid, t in self._paused_until.items() if t > now}
+            bucket = self._chats[chat_id] = TokenBucket(rate=self.chat_rate, capacity=self.chat_burst)
+        return bucket
+
+    async def call(self, chat_id: int, func, /, *args, chat_limited: bool = True, **kwargs):
+        """
+        Run a Bot API call under the rate limits, retrying on RetryAfter.
+
+        Returns:
+            The call's result, or None if Telegram kept asking to retry.
+            Other errors are raised to the caller.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            if chat_limited:
+                await self._chat_bucket(chat_id).acquire()
+            await self._global.acquire()
+            pause = self._paused_until.get(chat_id, 0.0) - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+
+            self.calls += 1
+            try:
+                return await func(*args, **kwargs)
+            except RetryAfter as e:
+                delay = _retry_seconds(e.retry_after)
+                self.retry_afters += 1
+                self._paused_until[chat_id] = max(self._paused_until.get(chat_id, 0.0), time.monotonic() + delay)
+                logger.warning(f"Telegram flood control in {chat_id}: retry after {delay}s (attempt {attempt})")
+
+        self.dropped += 1
+        logger.error(f"Giving up on {getattr(func, '__name__', 'call')} in {chat_id} after {self.max_attempts} attempts")
+        return None
+
+    async def send(self, bot, chat_id: int, text: str, **kwargs):
+        """Rate-limited send_message"""
+        return await self.call(chat_id, bot.send_message, chat_id=chat_id, text=text, **kwargs)
+
+    def notify(self, bot, chat_id: int, text: str, delete_after: Optional[float] = None):
+        """
+        Queue an HTML flash notice for a chat; notices arriving within the
+        window go out as one message (deleted after the longest delete_after).
+        """
+        self._notices.setdefault(chat_id, []).append((text, delete_after))
+        self.notices += 1
+        if chat_id not in self._timers:
+            self._timers[chat_id] = asyncio.create_task(self._flush_later(bot, chat_id))
+
+    async def _flush_later(self, bot, chat_id: int):
+        await asyncio.sleep(self.window)
+        self._timers.pop(chat_id, None)
+        notices = self._notices.pop(chat_id, [])
+        if not notices:
+            return
+
+        from src.deletion_scheduler import schedule_delete  # deletion_scheduler sends through this queue
+
+        texts = [text for text, _ in notices]
+        delays = [delay for _, delay in notices if delay is not None]
+        if len(texts) > 1:
+            texts.insert(0, f"📋 <b>{len(notices)} اطلاعیه:</b>")
+
+        try:
+            for chunk in self._chunks(texts):
+                message = await self.send(bot, chat_id, chunk, parse_mode="HTML")
+                self.notice_messages += 1
+                if message and delays:
+                    schedule_delete(chat_id, message.message_id, max(delays))
+        except Exception as e:
+            logger.error(f"Error sending {len(notices)} notices to {chat_id}: {e}")
+
+    @staticmethod
+    def _chunks(texts: List[str]):
+        """Join notices into messages under Telegram's length limit"""
+        chunk = ""
+        for text in texts:
+            text = text[:MAX_MESSAGE_LENGTH]
+            if chunk and len(chunk) + 2 + len(text) > MAX_MESSAGE_LENGTH:
+                yield chunk
+                chunk = ""
+            chunk = f"{chunk}\n\n{text}" if chunk else text
+        if chunk:
+            yield chunk
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "throttled": self._global.throttled,
+            "retry_afters": self.retry_afters,
+            "dropped": self.dropped,
+            "notices": self.notices,
+            "notice_messages": self.notice_messages,
+            "pending_notices": sum(len(n) for n in self._notices.values()),
+        }
+
+
+SEND_QUEUE = SendQueue(
+    global_rate=float(os.getenv("SEND_GLOBAL_RATE", "30")),
+    chat_rate_per_minute=float(os.getenv("SEND_CHAT_RATE_PER_MINUTE", "20")),
+    window=float(os.getenv("NOTICE_COALESCE_WINDOW", "1.5")),
+)
+metrics.register("send_queue", SEND_QUEUE.stats)
@@ -0,0 +1,461 @@
+"""
+SQLite Database Module
+Embedded storage backend implementing the DatabaseManager interface
+(select with DATABASE_BACKEND=sqlite)
+"""
+
+import os
+import logging
+import sqlite3
+import threading
+from typing import List, Optional
+
+from src.database import DatabaseManager, DEFAULT_BANNED_WORDS, DB_ERROR
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT,
+    warn_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS users_username_idx ON users (username);
+
+CREATE TABLE IF NOT EXISTS banned_words (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    word TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS banned_words_word_idx ON banned_words (word);
+
+CREATE TABLE IF NOT EXISTS media_verdicts (
+    file_unique_id TEXT PRIMARY KEY,
+    action TEXT NOT NULL,
+    reason TEXT,
+    phash INTEGER,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS sticker_sets (
+    set_name TEXT PRIMARY KEY,
+    action TEXT,
+    source TEXT,
+    allow_count INTEGER NOT NULL DEFAULT 0,
+    block_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS pending_approvals (
+    message_id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    file_unique_id TEXT,
+    sticker_set TEXT,
+    phash INTEGER,
+    created_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pending_approvals_created_at_idx ON pending_approvals (created_at);
+
+CREATE TABLE IF NOT EXISTS scheduled_deletions (
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    due_at REAL NOT NULL,
+    PRIMARY KEY (chat_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS scheduled_deletions_due_at_idx ON scheduled_deletions (due_at);
+"""
+
+# Columns added after a table was first created: (table, column, type)
+MIGRATIONS = [
+    ("media_verdicts", "phash", "INTEGER"),
+]
+
+# Statements are kept as constants so sqlite3's statement cache reuses the
+# prepared form on every call
+SELECT_USER = "SELECT user_id, username, warn_count FROM users WHERE user_id = ?"
+SELECT_USER_BY_USERNAME = "SELECT user_id FROM users WHERE username = ? LIMIT 1"
+SELECT_USER_IDS = "SELECT user_id FROM users LIMIT ?"
+INSERT_USER = "INSERT OR IGNORE INTO users (user_id, username, warn_count) VALUES (?, ?, 0)"
+INCREMENT_WARN = (
+    "INSERT INTO users (user_id, username, warn_count) VALUES (?, ?, 1) "
+    "ON CONFLICT (user_id) DO UPDATE SET warn_count = warn_count + 1"
+)
+SELECT_WARN_COUNT = "SELECT warn_count FROM users WHERE user_id = ?"
+RESET_WARNS = "UPDATE users SET warn_count = 0 WHERE user_id = ?"
+SELECT_WORDS = "SELECT word FROM banned_words"
+SELECT_ANY_WORD = "SELECT 1 FROM banned_words LIMIT 1"
+SELECT_WORD = "SELECT word FROM banned_words WHERE word = ?"
+INSERT_WORD = "INSERT OR IGNORE INTO banned_words (word) VALUES (?)"
+DELETE_WORD = "DELETE FROM banned_words WHERE word = ?"
+SELECT_MEDIA_VERDICT = "SELECT action, reason FROM media_verdicts WHERE file_unique_id = ?"
+UPSERT_MEDIA_VERDICT = (
+    "INSERT INTO media_verdicts (file_unique_id, action, reason, phash) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (file_unique_id) DO UPDATE SET action = excluded.action, reason = excluded.reason, "
+    "phash = COALESCE(excluded.phash, media_verdicts.phash)"
+)
+SELECT_STICKER_SET = (
+    "SELECT set_name, action, source, allow_count, block_count FROM sticker_sets WHERE set_name = ?"
+)
+INCREMENT_STICKER_SET = (
+    "INSERT INTO sticker_sets (set_name, allow_count, block_count) VALUES (?, ?, ?) "
+    "ON CONFLICT (set_name) DO UPDATE SET allow_count = allow_count + excluded.allow_count, "
+    "block_count = block_count + excluded.block_count, updated_at = CURRENT_TIMESTAMP"
+)
+PROMOTE_STICKER_SET = (
+    "UPDATE sticker_sets SET action = ?, source = 'auto' WHERE set_name = ? AND action IS NULL AND "
+    "CASE WHEN ? = 'ALLOW' THEN allow_count >= ? AND block_count = 0 ELSE block_count >= ? AND allow_count = 0 END"
+)
+SET_STICKER_SET_ACTION = (
+    "INSERT INTO sticker_sets (set_name, action, source) VALUES (?, ?, ?) "
+    "ON CONFLICT (set_name) DO UPDATE SET action = excluded.action, source = excluded.source, "
+    "updated_at = CURRENT_TIMESTAMP"
+)
+UPSERT_PENDING_APPROVAL = (
+    "INSERT OR REPLACE INTO pending_approvals "
+    "(message_id, chat_id, user_id, file_unique_id, sticker_set, phash, created_at) "
+    "VALUES (:message_id, :chat_id, :user_id, :file_unique_id, :sticker_set, :phash, :created_at)"
+)
+SELECT_PENDING_APPROVAL = "SELECT * FROM pending_approvals WHERE message_id = ?"
+SELECT_PENDING_APPROVALS = "SELECT * FROM pending_approvals WHERE created_at >= ? ORDER BY created_at"
+DELETE_PENDING_APPROVAL = "DELETE FROM pending_approvals WHERE message_id = ?"
+DELETE_EXPIRED_APPROVALS = "DELETE FROM pending_approvals WHERE created_at < ?"
+UPSERT_SCHEDULED_DELETION = (
+    "INSERT OR REPLACE INTO scheduled_deletions (chat_id, message_id, due_at) VALUES (?, ?, ?)"
+)
+SELECT_SCHEDULED_DELETIONS = "SELECT chat_id, message_id, due_at FROM scheduled_deletions"
+DELETE_DUE_DELETIONS = "DELETE FROM scheduled_deletions WHERE due_at <= ?"
+SELECT_BLOCKED_PHASHES = "SELECT phash, reason FROM media_verdicts WHERE action = 'BLOCK' AND phash IS NOT NULL"
+
+
+class SQLiteDatabaseManager(DatabaseManager):
+    """Database manager for an embedded SQLite file (WAL mode)"""
+
+    def _connect(self):
+        """Open the SQLite database and create the schema"""
+        self.path = os.getenv("SQLITE_PATH", "bot.db")
+        self.client = None
+
+        # One shared connection; the lock serializes access from the DB pool,
+        # the user flush thread and the event loop
+        self._conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,  # explicit BEGIN/COMMIT for batched transactions
+            cached_statements=256,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(SCHEMA)
+            for table, column, column_type in MIGRATIONS:
+                columns = {row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+        # Single node: no cross-instance sync or RPC
+        self._banned_words_sync = False
+        self._warn_rpc_available = False
+        logger.info(f"SQLite database opened at {self.path}")
+
+    def _execute(self, sql: str, params=()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _transaction(self, statements):
+        """Run (sql, params) pairs in one transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for sql, params in statements:
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # ==================== User Management ====================
+
+    def initialize_user(self, user_id: int, username: str) -> Optional[dict]:
+        try:
+            with self._lock:
+                self._conn.execute(INSERT_USER, (user_id, username))
+                row = self._conn.execute(SELECT_USER, (user_id,)).fetchone()
+            with self._users_lock:
+                self._remember_user(user_id)
+            return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Error initializing user {user_id}: {e}")
+            return None
+
+    def warm_known_users(self) -> int:
+        try:
+            rows = self._execute(SELECT_USER_IDS, (self._known_users_max,))
+            with self._users_lock:
+                for row in rows:
+                    self._remember_user(row["user_id"])
+            logger.info(f"Warmed known-user cache with {len(rows)} users")
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Error warming known-user cache: {e}")
+            return 0
+
+    def flush_pending_users(self) -> int:
+        with self._users_lock:
+            if not self._pending_users:
+                return 0
+            batch = self._pending_users
+            self._pending_users = {}
+
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.executemany(
+                        INSERT_USER, [(row["user_id"], row["username"]) for row in batch.values()]
+                    )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            logger.info(f"Flushed {len(batch)} new users")
+            return len(batch)
+        except Exception as e:
+            logger.error(f"Error flushing {len(batch)} new users: {e}")
+            with self._users_lock:
+                batch.update(self._pending_users)
+                self._pending_users = batch
+            return 0
+
+    def add_warn(self, user_id: int) -> Optional[int]:
+        """Atomic upsert-and-increment inside one transaction"""
+        try:
+            username = self._pending_username(user_id)
+            with self._lock:
+                self._transaction([(INCREMENT_WARN, (user_id, username))])
+                row = self._conn.execute(SELECT_WARN_COUNT, (user_id,)).fetchone()
+            self._drop_pending_user(user_id)
+            with self._users_lock:
+                self._remember_user(user_id)
+            new_warn_count = row["warn_count"]
+            logger.info(f"User {user_id} warned. New warn count: {new_warn_count}")
+            return new_warn_count
+        except Exception as e:
+            logger.error(f"Error adding warn to user {user_id}: {e}")
+            return None
+
+    def get_user_stats(self, user_id: int) -> Optional[dict]:
+        try:
+            rows = self._execute(SELECT_USER, (user_id,))
+            if not rows:
+                logger.warning(f"User {user_id} not found")
+                return None
+            return dict(rows[0])
+        except Exception as e:
+            logger.error(f"Error getting stats for user {user_id}: {e}")
+            return None
+
+    def get_user_id_by_username(self, username: str) -> Optional[int]:
+        try:
+            rows = self._execute(SELECT_USER_BY_USERNAME, (username.lstrip("@"),))
+            return rows[0]["user_id"] if rows else None
+        except Exception as e:
+            logger.error(f"Error finding user by username: {e}")
+            return None
+
+    def reset_warns(self, user_id: int) -> bool:
+        try:
+            self._transaction([(RESET_WARNS, (user_id,))])
+            logger.info(f"Reset warnings for user {user_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error resetting warns: {e}")
+            return False
+
+    # ==================== Banned Words Management ====================
+
+    def _select_banned_words(self) -> List[dict]:
+        return [dict(row) for row in self._execute(SELECT_WORDS)]
+
+    def sync_banned_words(self) -> int:
+        return 0
+
+    def initialize_default_banned_words(self) -> bool:
+        try:
+            if self._execute(SELECT_ANY_WORD):
+                logger.info("Banned words already exist in database")
+                return True
+
+            words = list(dict.fromkeys(w.lower() for w in DEFAULT_BANNED_WORDS))
+            self._transaction([(INSERT_WORD, (word,)) for word in words])
+            logger.info(f"Initialized {len(words)} default banned words")
+            return True
+        except Exception as e:
+            logger.error(f"Error initializing default banned words: {e}")
+            return False
+
+    def add_banned_word(self, word: str) -> Optional[dict]:
+        try:
+            word_lower = word.lower()
+            if self._execute(SELECT_WORD, (word_lower,)):
+                logger.info(f"Word '{word}' already in banned list")
+                return {"word": word_lower}
+
+            self._transaction([(INSERT_WORD, (word_lower,))])
+            self._cache_add_word(word_lower)
+            logger.info(f"Added '{word}' to banned words")
+            return {"word": word_lower}
+        except Exception as e:
+            logger.error(f"Error adding banned word '{word}': {e}")
+            return None
+
+    def remove_banned_word(self, word: str) -> bool:
+        try:
+            word_lower = word.lower()
+            self._transaction([(DELETE_WORD, (word_lower,))])
+            self._cache_remove_word(word_lower)
+            logger.info(f"Removed '{word}' from banned words")
+            return True
+        except Exception as e:
+            logger.error(f"Error removing banned word '{word}': {e}")
+            return False
+
+    # ==================== Media Verdicts ====================
+
+    def get_media_verdict(self, file_unique_id: str) -> Optional[dict]:
+        try:
+            rows = self._execute(SELECT_MEDIA_VERDICT, (file_unique_id,))
+            return dict(rows[0]) if rows else None
+        except Exception as e:
+            logger.error(f"Error getting media verdict for {file_unique_id}: {e}")
+            return None
+
+    def save_media_verdict(self, file_unique_id: str, action: str, reason: str, phash: Optional[int] = None) -> bool:
+        try:
+            self._transaction([(UPSERT_MEDIA_VERDICT, (file_unique_id, action, reason, phash))])
+            return True
+        except Exception as e:
+            logger.error(f"Error saving media verdict for {file_unique_id}: {e}")
+            return False
+
+    def get_blocked_phashes(self) -> List[dict]:
+        try:
+            return [dict(row) for row in self._execute(SELECT_BLOCKED_PHASHES)]
+        except Exception as e:
+            logger.error(f"Error loading blocked media hashes: {e}")
+            return []
+
+    # ==================== Sticker Sets ====================
+
+    def get_sticker_set(self, set_name: str):
+        try:
+            rows = self._execute(SELECT_STICKER_SET, (set_name,))
+            return dict(rows[0]) if rows else None
+        except Exception as e:
+            logger.error(f"Error getting sticker set {set_name}: {e}")
+            return DB_ERROR
+
+    def record_sticker_verdict(self, set_name: str, action: str, promote_threshold: int) -> Optional[dict]:
+        try:
+            with self._lock:
+                self._transaction([
+                    (INCREMENT_STICKER_SET, (set_name, int(action == "ALLOW"), int(action == "BLOCK"))),
+                    (PROMOTE_STICKER_SET, (action, set_name, action, promote_threshold, promote_threshold)),
+                ])
+                row = self._conn.execute(SELECT_STICKER_SET, (set_name,)).fetchone()
+            return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Error recording sticker verdict for {set_name}: {e}")
+            return None
+
+    def set_sticker_set_action(self, set_name: str, action: Optional[str], source: Optional[str]) -> bool:
+        try:
+            self._transaction([(SET_STICKER_SET_ACTION, (set_name, action, source))])
+            return True
+        except Exception as e:
+            logger.error(f"Error saving sticker set {set_name}: {e}")
+            return False
+
+    # ==================== Approval Queue ====================
+
+    def save_pending_approval(self, row: dict) -> bool:
+        try:
+            params = {key: row.get(key) for key in (
+                "message_id", "chat_id", "user_id", "file_unique_id", "sticker_set", "phash", "created_at"
+            )}
+            self._transaction([(UPSERT_PENDING_APPROVAL, params)])
+            return True
+        except Exception as e:
+            logger.error(f"Error saving pending approval {row.get('message_id')}: {e}")
+            return False
+
+    def get_pending_approval(self, message_id: int) -> Optional[dict]:
+        try:
+            rows = self._execute(SELECT_PENDING_APPROVAL, (message_id,))
+            return dict(rows[0]) if rows else None
+        except Exception as e:
+            logger.error(f"Error getting pending approval {message_id}: {e}")
+            return None
+
+    def get_pending_approvals(self, since: int) -> List[dict]:
+        try:
+            return [dict(row) for row in self._execute(SELECT_PENDING_APPROVALS, (since,))]
+        except Exception as e:
+            logger.error(f"Error loading pending approvals: {e}")
+            return []
+
+    def delete_pending_approvals(self, message_ids: List[int]) -> bool:
+        try:
+            self._transaction([(DELETE_PENDING_APPROVAL, (message_id,)) for message_id in message_ids])
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting pending approvals: {e}")
+            return False
+
+    def delete_expired_approvals(self, before: int) -> bool:
+        try:
+            self._transaction([(DELETE_EXPIRED_APPROVALS, (before,))])
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting expired approvals: {e}")
+            return False
+
+    # ==================== Scheduled Deletions ====================
+
+    def save_scheduled_deletions(self, rows: List[dict]) -> bool:
+        if not rows:
+            return True
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.executemany(
+                        UPSERT_SCHEDULED_DELETION,
+                        [(row["chat_id"], row["message_id"], row["due_at"]) for row in rows]
+                    )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            return True
+        except Exception as e:
+            logger.error(f"Error saving {len(rows)} scheduled deletions: {e}")
+            return False
+
+    def get_scheduled_deletions(self) -> List[dict]:
+        try:
+            return [dict(row) for row in self._execute(SELECT_SCHEDULED_DELETIONS)]
+        except Exception as e:
+            logger.error(f"Error loading scheduled deletions: {e}")
+            return []
+
+    def delete_scheduled_deletions(self, due_before: float) -> bool:
+        try:
+            self._transaction([(DELETE_DUE_DELETIONS, (due_before,))])
+            return True
+        except Exception as e:
+            logger.error(f"Error clearing scheduled deletions: {e}")
+            return False
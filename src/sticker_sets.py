@@ -0,0 +1,106 @@
+"""
+Sticker-pack level verdicts
+Admins allow/block whole packs; packs whose stickers keep getting the same
+verdict are promoted automatically
+"""
+
+import os
+import logging
+from typing import Optional
+from src.database import async_db, DB_ERROR
+from src.verdict_cache import VerdictCache, MISS
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+PACK_REASONS = {
+    "ALLOW": "پک استیکر مجاز",
+    "BLOCK": "پک استیکر ممنوع",
+}
+
+
+class StickerSetStore:
+    """
+    Verdicts and per-sticker tallies for sticker packs (by set_name).
+
+    Rows are cached (including "unknown pack" rows, so unjudged packs cost
+    one lookup per TTL). A pack with an action resolves every sticker in it
+    without a download; a pack without one is judged sticker by sticker,
+    and after `promote_threshold` consistent verdicts it gets that verdict.
+    """
+
+    def __init__(self, promote_threshold: int = 5, max_size: int = 5000, ttl: float = 600.0):
+        self.promote_threshold = promote_threshold
+        self._rows = VerdictCache(max_size=max_size, ttl=ttl)
+        self.hits = 0
+        self.promotions = 0
+        self.errors = 0
+
+    @staticmethod
+    def _blank(set_name: str) -> dict:
+        return {"set_name": set_name, "action": None, "source": None, "allow_count": 0, "block_count": 0}
+
+    async def _row(self, set_name: str) -> Optional[dict]:
+        """The pack's row (cached), or None if it couldn't be loaded (nothing is cached then)"""
+        row = self._rows.get(set_name)
+        if row is MISS:
+            row = await async_db.get_sticker_set(set_name)
+            if row is DB_ERROR:
+                self.errors += 1
+                return None
+            row = row or self._blank(set_name)
+            self._rows.put(set_name, row)
+        return row
+
+    async def get(self, set_name: Optional[str]) -> Optional[dict]:
+        """The pack's verdict ({"action", "reason"}) or None if stickers must be judged one by one"""
+        if not set_name:
+            return None
+        row = await self._row(set_name)
+        if not row or not row.get("action"):
+            return None
+        self.hits += 1
+        return {"action": row["action"], "reason": PACK_REASONS[row["action"]]}
+
+    async def record(self, set_name: Optional[str], action: str):
+        """Count one sticker's final verdict towards its pack; the database promotes consistent packs"""
+        if not set_name or action not in ("ALLOW", "BLOCK"):
+            return
+        row = await self._row(set_name)
+        if row is None or row.get("action"):
+            return
+
+        # Incremented server-side: never a read-modify-write of the whole row
+        updated = await async_db.record_sticker_verdict(set_name, action, self.promote_threshold)
+        if not updated:
+            return
+        self._rows.put(set_name, updated)
+        if updated.get("action") and updated.get("source") == "auto":
+            self.promotions += 1
+            logger.info(f"Sticker pack {set_name} auto-promoted to {updated['action']}")
+
+    async def set_action(self, set_name: str, action: Optional[str], source: str = "admin") -> bool:
+        """Set (or with action=None, clear) a pack's verdict"""
+        source = source if action else None
+        if not await async_db.set_sticker_set_action(set_name, action, source):
+            return False
+        cached = self._rows.get(set_name)
+        row = dict(cached) if cached is not MISS else self._blank(set_name)
+        row.update(action=action, source=source)
+        self._rows.put(set_name, row)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "cached_packs": len(self._rows),
+            "hits": self.hits,
+            "promotions": self.promotions,
+            "errors": self.errors,
+        }
+
+
+STICKER_SETS = StickerSetStore(
+    promote_threshold=int(os.getenv("STICKER_SET_PROMOTE_THRESHOLD", "5")),
+    ttl=float(os.getenv("STICKER_SET_CACHE_TTL", "600")),
+)
+metrics.register("sticker_sets", STICKER_SETS.stats)
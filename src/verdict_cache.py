@@ -0,0 +1,91 @@
+"""
+Bounded LRU/TTL cache for text moderation verdicts
+Repeated copies of the same message (spam raids) resolve in O(1)
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+# Returned by get() when there is no usable entry (None is a valid verdict)
+MISS = object()
+
+
+def text_key(text: str) -> bytes:
+    """Compact, fixed-size cache key for a message text"""
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+class VerdictCache:
+    """
+    LRU cache with a per-entry TTL, tied to a version stamp.
+
+    Entries are only valid for the version they were computed under; when
+    get() sees a new version (e.g. the banned word list changed) the whole
+    cache is dropped.
+    """
+
+    def __init__(self, max_size: int = 5000, ttl: float = 600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._version: Optional[Hashable] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _check_version(self, version: Hashable):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self._version = version
+
+    def get(self, key: Hashable, version: Hashable = None) -> Any:
+        """Cached verdict for key, or MISS"""
+        self._check_version(version)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISS
+
+        verdict, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return MISS
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return verdict
+
+    def put(self, key: Hashable, verdict: Any, version: Hashable = None):
+        """Store a verdict computed under version"""
+        self._check_version(version)
+        self._entries[key] = (verdict, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
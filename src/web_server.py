@@ -0,0 +1,173 @@
+"""
+Async HTTP server (aiohttp) on the bot's event loop
+Serves health checks and /metrics in every mode, and Telegram updates in webhook mode
+(/metrics only for requests carrying WEBHOOK_SECRET)
+"""
+
+import os
+import re
+import json
+import hmac
+import signal
+import asyncio
+import logging
+from typing import Optional
+from aiohttp import web
+from telegram import Update
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()  # "polling" or "webhook"
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Telegram allows 1-256 characters of A-Z, a-z, 0-9, _ and -
+SECRET_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,256}")
+
+
+class WebServer:
+    """
+    Health checks, metrics and (optionally) the Telegram webhook on one port.
+
+    Webhook requests are checked against the secret token Telegram echoes
+    in SECRET_HEADER, decoded, and put on the application's update queue;
+    Telegram gets its 200 as soon as the update is queued.
+    """
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 8080, webhook_path: str = "/telegram",
+                 secret_token: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.webhook_path = webhook_path
+        # Shared by every instance and kept across restarts, so it must come
+        # from the environment rather than be generated per process
+        self.secret_token = secret_token
+        self._application = None
+        self._runner: Optional[web.AppRunner] = None
+        self.updates = 0
+        self.rejected = 0
+
+    async def start(self, application=None, webhook: bool = False):
+        """Start serving (with the webhook route if `webhook`)"""
+        if self._runner:
+            return
+        self._application = application
+        app = web.Application()
+        app.router.add_get("/", self._health)
+        app.router.add_get("/health", self._health)
+        app.router.add_get("/metrics", self._metrics)
+        if webhook:
+            app.router.add_post(self.webhook_path, self._webhook)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"🌐 Web server listening on {self.host}:{self.port} ({'webhook' if webhook else 'health only'})")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _health(self, request: web.Request) -> web.Response:
+        return web.Response(text="I am alive!")
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        # The port is public: queue depths, breaker state and cache stats are for operators only
+        if not self._metrics_allowed(request):
+            self.rejected += 1
+            return web.Response(status=403)
+        return web.json_response(metrics.snapshot(), dumps=lambda data: json.dumps(data, default=str))
+
+    def _metrics_allowed(self, request: web.Request) -> bool:
+        """
+        The webhook secret in SECRET_HEADER or as a bearer token. Without a
+        secret nothing is allowed: behind a reverse proxy every client looks local.
+        """
+        if not self.secret_token:
+            return False
+        token = request.headers.get(SECRET_HEADER, "")
+        auth = request.headers.get("Authorization", "")
+        if auth.startswith("Bearer "):
+            token = auth[len("Bearer "):]
+        return hmac.compare_digest(token, self.secret_token)
+
+    async def _webhook(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not self.secret_token or not hmac.compare_digest(token, self.secret_token):
+            self.rejected += 1
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self._application.bot)
+        except Exception as e:
+            self.rejected += 1
+            logger.warning(f"Invalid webhook payload: {e}")
+            return web.Response(status=400)
+
+        await self._application.update_queue.put(update)
+        self.updates += 1
+        return web.Response()
+
+    def stats(self) -> dict:
+        return {
+            "mode": BOT_MODE,
+            "updates": self.updates,
+            "rejected": self.rejected,
+        }
+
+
+WEB_SERVER = WebServer(
+    port=int(os.getenv("PORT", "8080")),
+    webhook_path=os.getenv("WEBHOOK_PATH", "/telegram"),
+    secret_token=os.getenv("WEBHOOK_SECRET"),
+)
+metrics.register("web_server", WEB_SERVER.stats)
+
+
+async def run_webhook(application):
+    """
+    Run the application on webhook updates until SIGINT/SIGTERM
+    (the webhook counterpart of Application.run_polling)
+    """
+    base_url = os.getenv("WEBHOOK_URL")
+    if not base_url:
+        raise ValueError("WEBHOOK_URL must be set when BOT_MODE=webhook")
+    if not WEB_SERVER.secret_token or not SECRET_PATTERN.fullmatch(WEB_SERVER.secret_token):
+        raise ValueError(
+            "WEBHOOK_SECRET must be set when BOT_MODE=webhook "
+            "(1-256 characters of A-Z, a-z, 0-9, _ and -)"
+        )
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C raises KeyboardInterrupt instead
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        # post_init may already have started the server; this is a no-op then
+        await WEB_SERVER.start(application, webhook=True)
+        await application.bot.set_webhook(
+            url=base_url.rstrip("/") + WEB_SERVER.webhook_path,
+            secret_token=WEB_SERVER.secret_token,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40")),
+        )
+        await application.start()
+        logger.info("✅ Webhook set, waiting for updates")
+        await stop_event.wait()
+    finally:
+        # Stop accepting updates before the application stops processing them
+        await WEB_SERVER.stop()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
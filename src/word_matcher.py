@@ -0,0 +1,237 @@
+"""
+Compiled banned-word matcher (Aho-Corasick automaton)
+Matches every banned word against a message in one linear pass
+"""
+
+import logging
+import threading
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set
+from src.normalizer import FOLD_TABLE, normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class WordMatch(NamedTuple):
+    """A banned word hit and its [start, end) span in the original text"""
+    word: str
+    start: int
+    end: int
+
+
+def _lower_same_length(text: str) -> str:
+    """Lowercase text without shifting character offsets"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+class _Automaton(NamedTuple):
+    """
+    One compiled state of the matcher. Never mutated once published:
+    writers build a new one (copying what they change) and swap it in.
+    """
+    goto: List[Dict[str, int]]  # Node 0 is the root
+    terminal: List[Optional[str]]
+    fail: List[int]
+    # Nearest node (itself or via failure links) that ends a pattern
+    output: List[int]
+    # pattern -> words that produce it (raw and normalized forms)
+    owners: Dict[str, FrozenSet[str]]
+    words: FrozenSet[str]
+
+
+class BannedWordMatcher:
+    """
+    Aho-Corasick automaton over both the raw and the normalized form of
+    every banned word.
+
+    A message is scanned once; each character advances a "raw" state and,
+    when the character survives normalization, a "normalized" state, so a
+    single loop covers both the `word in text` check and the
+    `normalize_text(word) in normalize_text(text)` check.
+
+    Copy-on-write: build/add/remove (sync thread, DB executor threads)
+    publish a new _Automaton under a lock, and search reads the current one
+    once, so a scan never sees a half-updated trie and needs no lock.
+    """
+
+    def __init__(self, words: Iterable[str] = ()):
+        self._lock = threading.Lock()
+        self._state = self._compile([{}], [None], {}, frozenset())
+        self.build(words)
+
+    def __len__(self) -> int:
+        return len(self._state.words)
+
+    def __contains__(self, word: str) -> bool:
+        return word.lower() in self._state.words
+
+    # ==================== Building ====================
+
+    def build(self, words: Iterable[str]):
+        """Rebuild the automaton from scratch"""
+        with self._lock:
+            goto: List[Dict[str, int]] = [{}]
+            terminal: List[Optional[str]] = [None]
+            owners: Dict[str, Set[str]] = {}
+            known: Set[str] = set()
+            for word in words:
+                self._insert_word(goto, terminal, owners, known, word.lower())
+            state = self._state = self._compile(goto, terminal, owners, known)
+        logger.info(f"Banned word matcher compiled ({len(state.words)} words, {len(state.goto)} states)")
+
+    def add(self, word: str):
+        """Add a single word to a copy of the trie; only failure links are recomputed"""
+        word = word.lower()
+        with self._lock:
+            state = self._state
+            if not word or word in state.words:
+                return
+            goto = [dict(node) for node in state.goto]
+            terminal = list(state.terminal)
+            owners = {pattern: set(owner_words) for pattern, owner_words in state.owners.items()}
+            known = set(state.words)
+            self._insert_word(goto, terminal, owners, known, word)
+            self._state = self._compile(goto, terminal, owners, known)
+
+    def remove(self, word: str):
+        """Remove a single word; patterns shared with other words are kept"""
+        word = word.lower()
+        with self._lock:
+            state = self._state
+            if word not in state.words:
+                return
+            terminal = list(state.terminal)
+            owners = {pattern: set(owner_words) for pattern, owner_words in state.owners.items()}
+            for pattern in self._patterns_for(word):
+                pattern_owners = owners.get(pattern)
+                if pattern_owners is None:
+                    continue
+                pattern_owners.discard(word)
+                if not pattern_owners:
+                    del owners[pattern]
+                    terminal[self._find_node(state.goto, pattern)] = None
+            # The trie itself is unchanged and shared with the old state
+            self._state = self._compile(state.goto, terminal, owners, state.words - {word})
+
+    @staticmethod
+    def _patterns_for(word: str) -> Set[str]:
+        return {p for p in (word, normalize_text(word)) if p}
+
+    @classmethod
+    def _insert_word(cls, goto, terminal, owners, known, word: str):
+        if not word or word in known:
+            return
+        known.add(word)
+        for pattern in cls._patterns_for(word):
+            owners.setdefault(pattern, set()).add(word)
+            node = 0
+            for ch in pattern:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    terminal.append(None)
+                node = nxt
+            terminal[node] = pattern
+
+    @staticmethod
+    def _find_node(goto, pattern: str) -> int:
+        node = 0
+        for ch in pattern:
+            node = goto[node][ch]
+        return node
+
+    @staticmethod
+    def _compile(goto, terminal, owners, words) -> _Automaton:
+        """Compute failure and output links with a BFS over the trie"""
+        fail = [0] * len(goto)
+        output = [-1] * len(goto)
+        queue = []
+        for nxt in goto[0].values():
+            output[nxt] = nxt if terminal[nxt] else -1
+            queue.append(nxt)
+
+        i = 0
+        while i < len(queue):
+            node = queue[i]
+            i += 1
+            for ch, nxt in goto[node].items():
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                output[nxt] = nxt if terminal[nxt] else output[fail[nxt]]
+                queue.append(nxt)
+
+        return _Automaton(
+            goto, terminal, fail, output,
+            {pattern: frozenset(owner_words) for pattern, owner_words in owners.items()},
+            frozenset(words),
+        )
+
+    # ==================== Matching ====================
+
+    def find(self, text: str) -> Optional[str]:
+        """
+        Return the first banned word found in text, or None.
+
+        Args:
+            text: Message text (any case)
+        """
+        match = self.search(text)
+        return match.word if match else None
+
+    def search(self, text: str) -> Optional[WordMatch]:
+        """
+        Find the first banned word in text, with its span in the original text.
+
+        Args:
+            text: Message text (any case)
+
+        Returns:
+            WordMatch or None
+        """
+        state = self._state  # One consistent snapshot for the whole scan
+        if not text or not state.words:
+            return None
+
+        goto, fail, output, table = state.goto, state.fail, state.output, FOLD_TABLE
+        raw = norm = 0
+        last = None
+        # Offset map of the normalized stream back into text
+        offsets: List[int] = []
+        for i, ch in enumerate(_lower_same_length(text)):
+            raw = self._step(goto, fail, raw, ch)
+            if output[raw] >= 0:
+                word, length = self._owner(state, output[raw])
+                return WordMatch(word, i - length + 1, i + 1)
+
+            folded = table[ord(ch)]
+            if folded is None or folded == last:
+                continue
+            last = folded
+            offsets.append(i)
+            norm = self._step(goto, fail, norm, folded)
+            if output[norm] >= 0:
+                word, length = self._owner(state, output[norm])
+                return WordMatch(word, offsets[-length], i + 1)
+        return None
+
+    @staticmethod
+    def _step(goto, fail, state: int, ch: str) -> int:
+        while True:
+            nxt = goto[state].get(ch)
+            if nxt is not None:
+                return nxt
+            if state == 0:
+                return 0
+            state = fail[state]
+
+    @staticmethod
+    def _owner(state: _Automaton, node: int):
+        pattern = state.terminal[node]
+        owners = state.owners.get(pattern)
+        return (min(owners) if owners else pattern), len(pattern)